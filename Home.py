@@ -78,8 +78,9 @@ if df_data is not None and df_list is not None:
     st.sidebar.markdown("### 📊 Chart Options")
     
     # Date Range
-    min_date = df_data['Date'].min()
-    max_date = df_data['Date'].max()
+    # load_data sorts the rows by Date, so the first and last rows hold the date bounds
+    min_date = df_data['Date'].iat[0]
+    max_date = df_data['Date'].iat[-1]
     
     col1, col2 = st.sidebar.columns(2)
     with col1:
@@ -109,7 +110,7 @@ if df_data is not None and df_list is not None:
     
     # --- DATA CALCULATION ---
     # Use latest date for all current sections
-    latest_date = df_data['Date'].max()
+    latest_date = max_date
     analysis_df = calculate_price_changes(df_data, df_list, latest_date)
 
     # --- MAIN CONTENT ---
@@ -341,7 +342,7 @@ if df_data is not None and df_list is not None:
             date_filtered_data = df_data[
                 (df_data['Date'] >= pd.to_datetime(start_date)) & 
                 (df_data['Date'] <= pd.to_datetime(end_date))
-            ].copy()
+            ]
             
             # Get available commodities from filtered data and sort alphabetically
             available_commodities = date_filtered_data['Commodities'].unique()
@@ -383,30 +384,23 @@ if df_data is not None and df_list is not None:
                         # Color palette for different commodities - lighter colors
                         colors = ['#4ade80', '#f87171', '#60a5fa', '#fbbf24', '#a78bfa', '#fb7185', '#38bdf8', '#a3e635']
                         
+                        # Period codes of the coarser intervals; Daily plots every price
+                        interval_periods = {'Weekly': 'W', 'Monthly': 'M', 'Quarterly': 'Q'}
+                        
                         for i, commodity in enumerate(selected_line_commodities):
-                            commodity_data = date_filtered_data[date_filtered_data['Commodities'] == commodity].copy()
-                            commodity_data = commodity_data.sort_values('Date')
+                            # Rows come in Date order from load_data and are only read, so no copy or re-sort is needed
+                            commodity_data = date_filtered_data[date_filtered_data['Commodities'] == commodity]
                             
                             if not commodity_data.empty:
                                 # Apply interval aggregation
-                                if selected_interval == 'Daily':
+                                if selected_interval in interval_periods:
+                                    # Group by period and take the last price of each, dated at the period end
+                                    periods = commodity_data['Date'].dt.to_period(interval_periods[selected_interval])
+                                    period_prices = commodity_data.groupby(periods)['Price'].last()
+                                    aggregated_data = pd.DataFrame({'Date': period_prices.index.end_time, 'Price': period_prices.to_numpy()})
+                                else:
                                     # Use all data points
                                     aggregated_data = commodity_data
-                                elif selected_interval == 'Weekly':
-                                    # Group by week and take the last price of each week
-                                    commodity_data['Week'] = commodity_data['Date'].dt.to_period('W')
-                                    aggregated_data = commodity_data.groupby('Week').last().reset_index()
-                                    aggregated_data['Date'] = aggregated_data['Week'].dt.end_time
-                                elif selected_interval == 'Monthly':
-                                    # Group by month and take the last price of each month
-                                    commodity_data['Month'] = commodity_data['Date'].dt.to_period('M')
-                                    aggregated_data = commodity_data.groupby('Month').last().reset_index()
-                                    aggregated_data['Date'] = aggregated_data['Month'].dt.end_time
-                                elif selected_interval == 'Quarterly':
-                                    # Group by quarter and take the last price of each quarter
-                                    commodity_data['Quarter'] = commodity_data['Date'].dt.to_period('Q')
-                                    aggregated_data = commodity_data.groupby('Quarter').last().reset_index()
-                                    aggregated_data['Date'] = aggregated_data['Quarter'].dt.end_time
                                 
                                 color = colors[i % len(colors)]
                                 fig_line.add_trace(go.Scatter(
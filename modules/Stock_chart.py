@@ -3,6 +3,7 @@ import streamlit as st
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import pandas as pd
+import numpy as np
 import requests
 from datetime import datetime, timedelta
 
@@ -189,9 +190,8 @@ def Stock_price_plot(ticker: str):
             row=1, col=1
         )
         
-        # Add volume bars
-        colors = ['red' if row['close'] < row['open'] else 'green' 
-                  for _, row in df.iterrows()]
+        # Add volume bars, colored by up/down day with one vectorized compare
+        colors = np.where(df['close'].to_numpy() < df['open'].to_numpy(), 'red', 'green').tolist()
         
         fig.add_trace(
             go.Bar(
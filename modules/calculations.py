@@ -45,11 +45,11 @@ def calculate_price_changes(df_data, df_list, selected_date):
     # --- Calculate New Metrics ---
     fifty_two_weeks_ago = selected_date - pd.DateOffset(weeks=52)
     df_52w = df_snapshot[df_snapshot['Date'] >= fifty_two_weeks_ago]
-    stats_52w = df_52w.groupby('Commodities')['Price'].agg(['max', 'min']).rename(columns={'max': '52W High', 'min': '52W Low'})
+    stats_52w = df_52w.groupby('Commodities', observed=True)['Price'].agg(['max', 'min']).rename(columns={'max': '52W High', 'min': '52W Low'})
 
     thirty_days_ago = selected_date - pd.DateOffset(days=30)
     df_30d = df_snapshot[df_snapshot['Date'] >= thirty_days_ago]
-    avg_30d = df_30d.groupby('Commodities')['Price'].mean().rename('30D Avg')
+    avg_30d = df_30d.groupby('Commodities', observed=True)['Price'].mean().rename('30D Avg')
     
     current_data['Change type'] = np.where(current_data['%Week'] > 0, 'Positive', np.where(current_data['%Week'] < 0, 'Negative', 'Neutral'))
 
@@ -81,3 +81,142 @@ def calculate_price_changes(df_data, df_list, selected_date):
             final_df[col] = np.nan
 
     return final_df[display_cols]
+
+
+def _running_sums(x):
+    """Running sums of the non-NaN values of x and running counts of them, each with a leading zero row."""
+    valid = ~np.isnan(x)
+    zeros = np.zeros((1,) + x.shape[1:])
+    sums = np.concatenate((zeros, np.cumsum(np.where(valid, x, 0.0), axis=0)))
+    counts = np.concatenate((zeros, np.cumsum(valid, axis=0)))
+    return sums, counts
+
+
+def _window_means(sums, counts, window, min_periods):
+    """Trailing window means from the running sums and counts of _running_sums."""
+    end = np.arange(1, len(sums))
+    start = np.maximum(end - window, 0)
+    window_sums = sums[end] - sums[start]
+    window_counts = counts[end] - counts[start]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = window_sums / window_counts
+    out[window_counts < max(min_periods, 1)] = np.nan
+    return out
+
+
+def rolling_mean(values, window, min_periods=None):
+    """
+    Trailing moving average computed from cumulative sums in a single pass.
+    Matches pandas `rolling(window, min_periods).mean()`, including NaN handling.
+    A 2-D array is averaged column by column.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    if min_periods is None:
+        min_periods = window
+
+    sums, counts = _running_sums(x)
+    return _window_means(sums, counts, window, min_periods)
+
+
+def rolling_means(values, windows, min_periods=None):
+    """
+    Trailing moving averages for several windows, all taken from one pass of cumulative sums.
+    Returns a dict of window -> array, each matching `rolling_mean(values, window, min_periods)`.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    sums, counts = _running_sums(x)
+    return {
+        window: _window_means(sums, counts, window, window if min_periods is None else min_periods)
+        for window in windows
+    }
+
+
+def macd_lines(values, fast=12, slow=26, signal=9):
+    """
+    MACD line, signal line and histogram of a price series, as NumPy arrays.
+    Uses the same recursive EMAs as pandas `ewm(span, adjust=False)`, on a plain
+    positional series so the arithmetic between them needs no index alignment.
+    """
+    prices = pd.Series(np.asarray(values, dtype=np.float64))
+    fast_ema = prices.ewm(span=fast, adjust=False).mean().to_numpy()
+    slow_ema = prices.ewm(span=slow, adjust=False).mean().to_numpy()
+    macd_line = fast_ema - slow_ema
+    signal_line = pd.Series(macd_line).ewm(span=signal, adjust=False).mean().to_numpy()
+    return macd_line, signal_line, macd_line - signal_line
+
+
+def rsi(values, period=14):
+    """
+    Relative strength index of a price series, as a NumPy array.
+    Gains and losses are smoothed like pandas `ewm(alpha=1/period, min_periods=period, adjust=False)`,
+    both in one ewm pass over a two-column frame.
+    """
+    prices = np.asarray(values, dtype=np.float64)
+    delta = np.diff(prices, prepend=np.nan)
+    moves = pd.DataFrame({
+        'gain': np.where(delta > 0, delta, 0.0),
+        'loss': np.where(delta < 0, -delta, 0.0)
+    })
+    averages = moves.ewm(alpha=1/period, min_periods=period, adjust=False).mean().to_numpy()
+
+    # 100 - 100 / (1 + gain / loss) rearranged to one division, which needs no special case for windows without losses
+    average_gain, average_loss = averages[:, 0], averages[:, 1]
+    with np.errstate(invalid='ignore'):
+        return 100 * average_gain / (average_gain + average_loss)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+    Returns every index when the series already has n_out points or fewer.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # First and last points are always kept; the rest is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        # Keep the point forming the largest triangle with the previous pick and the next bucket's mean
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) -
+            (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        indices[i + 1] = a
+
+    return indices
+
+
+def steel_costs_profits(input_prices, output_prices, depreciation=35, sga=19, tax_rate=0.12):
+    """
+    Production cost and per-ton profits of a steel mill from NumPy price blocks.
+    `input_prices` columns are iron ore, met coal and scrap (1.6t, 0.6t and 0.1t per ton of steel);
+    `output_prices` columns are HRC and long steel.
+    """
+    raw_material_cost = np.asarray(input_prices, dtype=np.float64) @ np.array([1.6, 0.6, 0.1])
+    production_cost = raw_material_cost + (depreciation + sga)
+
+    # Both products' margins in one broadcast over the output block
+    pretax = np.asarray(output_prices, dtype=np.float64) - production_cost[:, None]
+    profits = pretax * (1 - tax_rate)
+    return {
+        'Raw_Material_Cost': raw_material_cost,
+        'Production_Cost': production_cost,
+        'HRC_Profit_PreTax': pretax[:, 0],
+        'Long_Steel_Profit_PreTax': pretax[:, 1],
+        'HRC_Profit': profits[:, 0],
+        'Long_Steel_Profit': profits[:, 1]
+    }
@@ -1,3 +1,6 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import openai
 import streamlit as st
 
@@ -10,84 +13,97 @@ def init_openai_client():
     client = openai.OpenAI(api_key=st.secrets['OPENAI_API_KEY'])
     return client
 
+def _usage_summary(usage):
+    """Token usage and estimated cost of a completion"""
+    return {
+        'prompt_tokens': usage.prompt_tokens,
+        'completion_tokens': usage.completion_tokens,
+        'total_tokens': usage.total_tokens,
+        'estimated_cost': f"${(usage.total_tokens / 1000) * 0.03:.4f}"  # $0.03 per 1K tokens
+    }
+
+def _analysis_messages(commodity_data, commodity_name, analysis_type):
+    """Build the chat messages for a commodity analysis request"""
+    # Calculate additional metrics
+    latest_price = commodity_data['Price'].iloc[-1]
+    avg_price = commodity_data['Price'].mean()
+    std_price = commodity_data['Price'].std()
+    max_price = commodity_data['Price'].max()
+    min_price = commodity_data['Price'].min()
+    price_volatility = std_price / avg_price
+    
+    # Define different analysis types
+    analysis_prompts = {
+        "comprehensive": f"""
+        Analyze the following commodity data for {commodity_name}:
+        Latest price: ${latest_price:.2f}
+        Average price: ${avg_price:.2f}
+        Price volatility: {price_volatility:.2%}
+        52-week range: ${min_price:.2f} - ${max_price:.2f}
+        
+        Price changes:
+        1D: {f"{commodity_data['%Day'].iloc[-1]:.2%}" if '%Day' in commodity_data.columns else "N/A"}
+        1W: {f"{commodity_data['%Week'].iloc[-1]:.2%}" if '%Week' in commodity_data.columns else "N/A"}
+        1M: {f"{commodity_data['%Month'].iloc[-1]:.2%}" if '%Month' in commodity_data.columns else "N/A"}
+        YTD: {f"{commodity_data['%YTD'].iloc[-1]:.2%}" if '%YTD' in commodity_data.columns else "N/A"}
+
+        Please provide:
+        1. Comprehensive market analysis
+        2. Key factors affecting the price
+        3. Technical analysis insights
+        4. Short-term and medium-term outlook
+        5. Key price levels to watch
+        Keep the response structured and actionable.
+        """,
+        
+        "technical": f"""
+        Provide technical analysis for {commodity_name} based on:
+        Current price: ${latest_price:.2f}
+        Moving averages: 
+        - Price vs Average: {(latest_price/avg_price - 1):.2%}
+        - Volatility: {price_volatility:.2%}
+        - Price Range: ${min_price:.2f} - ${max_price:.2f}
+        
+        Focus on:
+        1. Technical indicators and patterns
+        2. Support and resistance levels
+        3. Trading volume analysis
+        4. Price momentum
+        5. Risk levels
+        """,
+        
+        "risk": f"""
+        Analyze risk factors for {commodity_name}:
+        Current price: ${latest_price:.2f}
+        Volatility: {price_volatility:.2%}
+        Price deviation from mean: {(latest_price/avg_price - 1):.2%}
+        
+        Provide:
+        1. Key risk factors
+        2. Market exposure assessment
+        3. Volatility analysis
+        4. Correlation with major markets
+        5. Risk mitigation strategies
+        """
+    }
+
+    # Pick the prompt for the requested analysis type
+    selected_prompt = analysis_prompts.get(analysis_type, analysis_prompts["comprehensive"])
+    
+    return [
+        {"role": "system", "content": "You are a commodity market expert providing concise, data-driven analysis."},
+        {"role": "user", "content": selected_prompt}
+    ]
+
 def get_commodity_analysis(client, commodity_data, commodity_name, analysis_type="comprehensive"):
     """Get ChatGPT analysis for a specific commodity with different analysis types"""
     if client is None:
         return {"error": "OpenAI client not initialized"}
     
     try:
-        # Calculate additional metrics
-        latest_price = commodity_data['Price'].iloc[-1]
-        avg_price = commodity_data['Price'].mean()
-        std_price = commodity_data['Price'].std()
-        max_price = commodity_data['Price'].max()
-        min_price = commodity_data['Price'].min()
-        price_volatility = std_price / avg_price
-        
-        # Define different analysis types
-        analysis_prompts = {
-            "comprehensive": f"""
-            Analyze the following commodity data for {commodity_name}:
-            Latest price: ${latest_price:.2f}
-            Average price: ${avg_price:.2f}
-            Price volatility: {price_volatility:.2%}
-            52-week range: ${min_price:.2f} - ${max_price:.2f}
-            
-            Price changes:
-            1D: {f"{commodity_data['%Day'].iloc[-1]:.2%}" if '%Day' in commodity_data.columns else "N/A"}
-            1W: {f"{commodity_data['%Week'].iloc[-1]:.2%}" if '%Week' in commodity_data.columns else "N/A"}
-            1M: {f"{commodity_data['%Month'].iloc[-1]:.2%}" if '%Month' in commodity_data.columns else "N/A"}
-            YTD: {f"{commodity_data['%YTD'].iloc[-1]:.2%}" if '%YTD' in commodity_data.columns else "N/A"}
-
-            Please provide:
-            1. Comprehensive market analysis
-            2. Key factors affecting the price
-            3. Technical analysis insights
-            4. Short-term and medium-term outlook
-            5. Key price levels to watch
-            Keep the response structured and actionable.
-            """,
-            
-            "technical": f"""
-            Provide technical analysis for {commodity_name} based on:
-            Current price: ${latest_price:.2f}
-            Moving averages: 
-            - Price vs Average: {(latest_price/avg_price - 1):.2%}
-            - Volatility: {price_volatility:.2%}
-            - Price Range: ${min_price:.2f} - ${max_price:.2f}
-            
-            Focus on:
-            1. Technical indicators and patterns
-            2. Support and resistance levels
-            3. Trading volume analysis
-            4. Price momentum
-            5. Risk levels
-            """,
-            
-            "risk": f"""
-            Analyze risk factors for {commodity_name}:
-            Current price: ${latest_price:.2f}
-            Volatility: {price_volatility:.2%}
-            Price deviation from mean: {(latest_price/avg_price - 1):.2%}
-            
-            Provide:
-            1. Key risk factors
-            2. Market exposure assessment
-            3. Volatility analysis
-            4. Correlation with major markets
-            5. Risk mitigation strategies
-            """
-        }
-
-        # Get response from ChatGPT
-        selected_prompt = analysis_prompts.get(analysis_type, analysis_prompts["comprehensive"])
-        
         response = client.chat.completions.create(
             model="gpt-4",  # or gpt-3.5-turbo
-            messages=[
-                {"role": "system", "content": "You are a commodity market expert providing concise, data-driven analysis."},
-                {"role": "user", "content": selected_prompt}
-            ],
+            messages=_analysis_messages(commodity_data, commodity_name, analysis_type),
             max_tokens=500,
             temperature=0.7
         )
@@ -95,12 +111,7 @@ def get_commodity_analysis(client, commodity_data, commodity_name, analysis_type
         # Create response dict with content and token usage
         analysis_response = {
             'content': response.choices[0].message.content,
-            'usage': {
-                'prompt_tokens': response.usage.prompt_tokens,
-                'completion_tokens': response.usage.completion_tokens,
-                'total_tokens': response.usage.total_tokens,
-                'estimated_cost': f"${(response.usage.total_tokens / 1000) * 0.03:.4f}"  # $0.03 per 1K tokens
-            }
+            'usage': _usage_summary(response.usage)
         }
 
         return analysis_response
@@ -108,33 +119,79 @@ def get_commodity_analysis(client, commodity_data, commodity_name, analysis_type
     except Exception as e:
         return f"Error getting analysis: {str(e)}"
 
-def chat_with_commodity_expert(client, user_question, commodity_context=None):
-    """Chat with GPT about commodities with context"""
+def get_commodity_analysis_stream(client, commodity_data, commodity_name, analysis_type="comprehensive", usage=None):
+    """Stream ChatGPT analysis token by token; token usage is written into `usage` when the stream completes"""
     if client is None:
-        return "Error: OpenAI client not initialized"
+        yield "Error: OpenAI client not initialized"
+        return
     
     try:
-        # Prepare the system message with context
-        system_message = """You are a commodity market expert assistant. 
-        Provide clear, concise, and accurate information about commodity markets, 
-        trends, and analysis. Use data when available to support your responses."""
+        stream = client.chat.completions.create(
+            model="gpt-4",  # or gpt-3.5-turbo
+            messages=_analysis_messages(commodity_data, commodity_name, analysis_type),
+            max_tokens=500,
+            temperature=0.7,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
 
-        messages = [{"role": "system", "content": system_message}]
-        
-        # Add context if available
-        if commodity_context:
-            messages.append({
-                "role": "system", 
-                "content": f"Current context: {commodity_context}"
-            })
-        
-        # Add user question
-        messages.append({"role": "user", "content": user_question})
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            # The final chunk carries the usage for the whole completion
+            if chunk.usage is not None and usage is not None:
+                usage.update(_usage_summary(chunk.usage))
+
+    except Exception as e:
+        yield f"Error getting analysis: {str(e)}"
+
+def get_commodity_analyses(client, commodity_data, commodity_name, analysis_types, requests_per_minute=60):
+    """Run several analysis types concurrently; maps each type to what get_commodity_analysis returns for it"""
+    interval = 60 / requests_per_minute
+
+    def run(position, analysis_type):
+        # Stagger the request starts so a burst stays under the API rate limit
+        time.sleep(position * interval)
+        return get_commodity_analysis(client, commodity_data, commodity_name, analysis_type)
+
+    with ThreadPoolExecutor(max_workers=len(analysis_types)) as executor:
+        results = executor.map(run, range(len(analysis_types)), analysis_types)
+        return dict(zip(analysis_types, results))
+
+def _chat_messages(user_question, commodity_context=None, history=None):
+    """Build the chat messages for a question to the commodity expert"""
+    # Prepare the system message with context
+    system_message = """You are a commodity market expert assistant. 
+    Provide clear, concise, and accurate information about commodity markets, 
+    trends, and analysis. Use data when available to support your responses."""
 
+    messages = [{"role": "system", "content": system_message}]
+    
+    # Add context if available
+    if commodity_context:
+        messages.append({
+            "role": "system", 
+            "content": f"Current context: {commodity_context}"
+        })
+    
+    # Add the earlier conversation turns, if any
+    if history:
+        messages.extend(history)
+    
+    # Add user question
+    messages.append({"role": "user", "content": user_question})
+    return messages
+
+def chat_with_commodity_expert(client, user_question, commodity_context=None, history=None):
+    """Chat with GPT about commodities with context"""
+    if client is None:
+        return "Error: OpenAI client not initialized"
+    
+    try:
         # Get response from ChatGPT
         response = client.chat.completions.create(
             model="gpt-4",  # or gpt-3.5-turbo
-            messages=messages,
+            messages=_chat_messages(user_question, commodity_context, history),
             max_tokens=500,
             temperature=0.7
         )
@@ -143,3 +200,50 @@ def chat_with_commodity_expert(client, user_question, commodity_context=None):
 
     except Exception as e:
         return f"Error: {str(e)}"
+
+def chat_with_commodity_expert_stream(client, user_question, commodity_context=None, history=None):
+    """Stream the commodity expert's answer token by token"""
+    if client is None:
+        yield "Error: OpenAI client not initialized"
+        return
+    
+    try:
+        stream = client.chat.completions.create(
+            model="gpt-4",  # or gpt-3.5-turbo
+            messages=_chat_messages(user_question, commodity_context, history),
+            max_tokens=500,
+            temperature=0.7,
+            stream=True
+        )
+
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    except Exception as e:
+        yield f"Error: {str(e)}"
+
+def summarize_chat_history(client, messages, previous_summary=None):
+    """Condense older chat turns into a short summary that can stand in for them; keeps the previous summary on failure"""
+    if client is None or not messages:
+        return previous_summary
+    
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    if previous_summary:
+        transcript = f"Earlier summary: {previous_summary}\n{transcript}"
+    
+    try:
+        response = client.chat.completions.create(
+            model="gpt-4",  # or gpt-3.5-turbo
+            messages=[
+                {"role": "system", "content": "Summarize this conversation about commodity markets in a few sentences, keeping any facts, figures and open questions the user may refer back to."},
+                {"role": "user", "content": transcript}
+            ],
+            max_tokens=200,
+            temperature=0.3
+        )
+
+        return response.choices[0].message.content
+
+    except Exception:
+        return previous_summary
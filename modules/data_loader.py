@@ -39,23 +39,29 @@ def load_data():
         df_data.dropna(subset=['Date', 'Commodities', 'Price'], inplace=True)
         df_list.dropna(subset=['Commodities'], inplace=True)
 
-        # 6. Calculate percentage changes
+        # 6. Calculate percentage changes, for all commodities at once from one grouping of the prices
         df_data = df_data.sort_values('Date')
-        for commodity in df_data['Commodities'].unique():
-            commodity_data = df_data[df_data['Commodities'] == commodity].copy()
-            
-            # Calculate daily change
-            df_data.loc[commodity_data.index, '%Day'] = commodity_data['Price'].pct_change()
-            
-            # Calculate weekly change
-            df_data.loc[commodity_data.index, '%Week'] = commodity_data['Price'].pct_change(periods=5)  # Assuming 5 trading days
-            
-            # Calculate monthly change
-            df_data.loc[commodity_data.index, '%Month'] = commodity_data['Price'].pct_change(periods=21)  # Assuming 21 trading days
-            
-            # Calculate YTD change
-            year_start = commodity_data[commodity_data['Date'].dt.dayofyear == 1]['Price'].iloc[0] if not commodity_data[commodity_data['Date'].dt.dayofyear == 1].empty else commodity_data['Price'].iloc[0]
-            df_data.loc[commodity_data.index, '%YTD'] = (commodity_data['Price'] - year_start) / year_start
+        prices_by_commodity = df_data.groupby('Commodities', sort=False)['Price']
+        
+        # Calculate daily change
+        df_data['%Day'] = prices_by_commodity.pct_change()
+        
+        # Calculate weekly change
+        df_data['%Week'] = prices_by_commodity.pct_change(periods=5)  # Assuming 5 trading days
+        
+        # Calculate monthly change
+        df_data['%Month'] = prices_by_commodity.pct_change(periods=21)  # Assuming 21 trading days
+        
+        # Calculate YTD change from each commodity's first Jan 1 price, or its first price if it has none
+        jan_first_prices = df_data['Price'].where(df_data['Date'].dt.dayofyear == 1)
+        year_start = jan_first_prices.groupby(df_data['Commodities'], sort=False).transform('first')
+        year_start = year_start.fillna(prices_by_commodity.transform('first'))
+        df_data['%YTD'] = (df_data['Price'] - year_start) / year_start
+
+        # 7. Downcast numeric columns to float32 and store commodity names as categories
+        for col in ['Price', '%Day', '%Week', '%Month', '%YTD']:
+            df_data[col] = pd.to_numeric(df_data[col], downcast='float')
+        df_data['Commodities'] = df_data['Commodities'].astype('category')
 
         return df_data, df_list
     except FileNotFoundError:
@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
 
@@ -284,25 +285,23 @@ def style_dataframe(df: pd.DataFrame):
     }
     percent_cols = ['%Day', '%Week', '%Month', '%Quarter', '%YTD']
 
-    # Hàm style (giữ nguyên)
-    def style_percent_cell(val):
-        if pd.isna(val):
-            return 'font-weight: 300;'
-        
-        if val > 0:
-            bg_intensity = min(abs(val) * 10, 1.5)
-            return f'background-color: rgba(16, 185, 129, {bg_intensity}); font-weight: 300;'
-        elif val < 0:
-            bg_intensity = min(abs(val) * 10, 1.5)
-            return f'background-color: rgba(225, 29, 72, {bg_intensity}); font-weight: 300;'
-        else:
-            return 'background-color: #FFFFFF; font-weight: 300;'
+    # Styles for a whole percent column at once; the background strength follows the size of the move
+    def style_percent_column(col):
+        vals = col.to_numpy()
+        intensity = np.minimum(np.abs(vals) * 10, 1.5).astype(str)
+        positive = np.char.add(np.char.add('background-color: rgba(16, 185, 129, ', intensity), '); font-weight: 300;')
+        negative = np.char.add(np.char.add('background-color: rgba(225, 29, 72, ', intensity), '); font-weight: 300;')
+        return np.select(
+            [pd.isna(vals), vals > 0, vals < 0],
+            [np.full(len(vals), 'font-weight: 300;'), positive, negative],
+            'background-color: #FFFFFF; font-weight: 300;'
+        )
 
     styler = df_to_style.style.format(format_dict, na_rep='—')
     
-    for col in percent_cols:
-        if col in df_to_style.columns:
-            styler = styler.applymap(style_percent_cell, subset=[col])
+    styled_percent_cols = [col for col in percent_cols if col in df_to_style.columns]
+    if styled_percent_cols:
+        styler = styler.apply(style_percent_column, subset=styled_percent_cols)
     
     text_columns = ['Commodities', 'Sector', 'Nation', 'Change type', 'Impact']
     
@@ -1,7 +1,106 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import plotly.graph_objects as go
 from modules.data_loader import load_data
-from modules.chatgpt_helper import init_openai_client, get_commodity_analysis, chat_with_commodity_expert
+from modules.calculations import rolling_mean, lttb_indices
+from modules.chatgpt_helper import (
+    init_openai_client,
+    get_commodity_analysis_stream,
+    get_commodity_analyses,
+    chat_with_commodity_expert_stream,
+    summarize_chat_history
+)
+
+
+@st.cache_data(show_spinner=False)
+def build_price_figure(_commodity_data, commodity, data_version, hide_gaps):
+    """Build the price/moving-average and returns figure for one commodity"""
+    # Calculate moving averages and daily returns on the full history
+    prices = _commodity_data['Price'].to_numpy(dtype=np.float64)
+    chart_data = _commodity_data[['Price']].assign(
+        MA20=rolling_mean(prices, 20),
+        MA50=rolling_mean(prices, 50),
+        Returns=np.diff(prices, prepend=np.nan) / np.roll(prices, 1)
+    )
+    
+    # Long histories get weekly return bars rather than one bar per trading day
+    if len(chart_data) > 800:
+        weekly_prices = chart_data['Price'].resample('W').last().dropna()
+        returns = weekly_prices.pct_change().dropna()
+        returns_name = 'Weekly Returns'
+    else:
+        returns = chart_data['Returns']
+        returns_name = 'Daily Returns'
+    
+    # Downsample long histories (LTTB) so the browser only draws ~1500 points per trace
+    if len(chart_data) > 2000:
+        keep = lttb_indices(chart_data.index.astype('int64').to_numpy(), prices, 1500)
+        chart_data = chart_data.iloc[keep]
+    
+    # WebGL lines render faster, but Plotly hides scattergl traces on axes with rangebreaks
+    line_trace = go.Scatter if hide_gaps else go.Scattergl
+    # Plain arrays keep the serialized trace payload to just x/y values
+    dates = chart_data.index.to_numpy()
+    traces = [
+        line_trace(x=dates, y=chart_data['Price'].to_numpy(), name='Price',
+                   line=dict(color='#2563eb')),
+        line_trace(x=dates, y=chart_data['MA20'].to_numpy(), name='20-day MA',
+                   line=dict(color='#f59e0b', dash='dash')),
+        line_trace(x=dates, y=chart_data['MA50'].to_numpy(), name='50-day MA',
+                   line=dict(color='#10b981', dash='dash')),
+        go.Bar(x=returns.index.to_numpy(), y=returns.to_numpy(), name=returns_name,
+               marker_color='#3b82f6', yaxis='y2', hoverinfo='skip')
+    ]
+    
+    # Shared x-axis below the returns panel, with shorter date labels and optional weekend breaks
+    xaxis = dict(domain=[0, 1], anchor='y2', tickformat='%b %y', tickangle=-30)
+    if hide_gaps:
+        xaxis['rangebreaks'] = [dict(bounds=["sat", "mon"])]
+    
+    layout = go.Layout(
+        height=600,
+        title=f"{commodity} Price Analysis",
+        uirevision=commodity,
+        showlegend=True,
+        legend=dict(
+            yanchor="top",
+            y=0.99,
+            xanchor="left",
+            x=0.01
+        ),
+        xaxis=xaxis,
+        yaxis=dict(domain=[0.3, 1], title_text="Price ($)"),
+        yaxis2=dict(domain=[0, 0.27], anchor='x', title_text="Returns (%)")
+    )
+    
+    return go.Figure(data=traces, layout=layout)
+
+
+@st.cache_data(show_spinner=False)
+def build_chat_context(_df_data, latest_date):
+    """Compact CSV of the latest prices for the chat context, limited to the 20 biggest daily movers"""
+    latest_data = _df_data.loc[latest_date:latest_date, ['Commodities', 'Price', '%Day']]
+    top_movers = latest_data.sort_values('%Day', key=lambda s: s.abs(), ascending=False).head(20)
+    return f"Latest commodity prices and changes:\n{top_movers.to_csv(index=False, float_format='%.6g')}"
+
+
+@st.cache_data(show_spinner=False)
+def build_commodity_stats(_df_data, data_version):
+    """Price statistics for every commodity in one grouped pass, indexed by commodity"""
+    stats = _df_data.groupby('Commodities', observed=True)['Price'].agg(['last', 'mean', 'std', 'min', 'max'])
+    return stats.rename(columns={'last': 'Current'})
+
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def load_shared_data():
+    """Load the commodity data once and share the same frames across sessions and reruns"""
+    df_data, df_list = load_data()
+    if df_data is not None:
+        # Index by sorted Date so the latest rows are a binary-search slice rather than a full scan
+        df_data = df_data.sort_values('Date', kind='stable').set_index('Date')
+    return df_data, df_list
+
 
 # Page config
 st.set_page_config(
@@ -21,260 +120,270 @@ if client is None:
     st.stop()
 
 # Load data
-df_data, df_list = load_data()
+df_data, df_list = load_shared_data()
+if df_data is not None:
+    latest_date = df_data.index[-1]
+    data_version = str(latest_date.date())
+
+# Responses already fetched this session, keyed by their inputs
+if "analysis_cache" not in st.session_state:
+    st.session_state.analysis_cache = {}
+if "chat_cache" not in st.session_state:
+    st.session_state.chat_cache = {}
+
+# Tab contents run as fragments, so their widgets only rerun their own tab
+@st.fragment
+def render_analysis_tab(df_data):
+    """AI analysis controls and results for a single commodity"""
+    st.subheader("AI-Powered Commodity Analysis")
+
+    # Create two columns for layout
+    col1, col2 = st.columns([1, 2])
+
+    with col1:
+        # Commodity selector; the categories are fixed and sorted when the data is loaded, so there is no per-rerun scan
+        available_commodities = df_data['Commodities'].cat.categories.tolist()
+        selected_commodity = st.selectbox(
+            "Select a commodity",
+            options=available_commodities
+        )
+
+        # Analysis type selector
+        analysis_type = st.radio(
+            "Analysis Type",
+            ["comprehensive", "technical", "risk"],
+            format_func=lambda x: x.title()
+        )
+
+        # Chart options
+        hide_gaps = st.checkbox("Hide non-trading gaps", value=True)
+
+        generate_button = st.button("🔄 Generate Analysis", use_container_width=True)
+        generate_all_button = st.button("⚡ Generate All Types", use_container_width=True)
+
+        # Add save to PDF button (placeholder for future feature)
+        if st.button("💾 Save Analysis", use_container_width=True):
+            st.info("PDF export feature coming soon!")
+
+    # Keep the generated analysis on screen while the user switches views or chart options
+    if generate_button or generate_all_button:
+        st.session_state.active_analysis = (selected_commodity, "all" if generate_all_button else analysis_type)
+        st.session_state.analysis_view = "📊 Analysis"
+
+    with col2:
+        if "active_analysis" in st.session_state:
+            active_commodity, active_type = st.session_state.active_analysis
+
+            # Only the selected view is computed; st.tabs would build all three on every run
+            view = st.radio(
+                "View",
+                ["📊 Analysis", "📈 Data", "🔍 Visualization"],
+                horizontal=True,
+                label_visibility="collapsed",
+                key="analysis_view"
+            )
+
+            with st.spinner("Analyzing data..."):
+                # Get data for selected commodity
+                commodity_data = df_data[df_data['Commodities'] == active_commodity]
+
+                if not commodity_data.empty:
+                    if view == "📊 Analysis":
+                        st.markdown("### Analysis Results")
+
+                        if active_type == "all":
+                            # Fetch the types not analyzed yet in parallel, then show each one in its own expander
+                            analysis_types = ["comprehensive", "technical", "risk"]
+                            missing = [t for t in analysis_types
+                                       if (active_commodity, t, data_version) not in st.session_state.analysis_cache]
+                            results = get_commodity_analyses(client, commodity_data, active_commodity, missing) if missing else {}
+                            for t, result in results.items():
+                                if isinstance(result, dict) and 'content' in result:
+                                    st.session_state.analysis_cache[(active_commodity, t, data_version)] = result
+
+                            for t in analysis_types:
+                                with st.expander(f"{t.title()} Analysis", expanded=(t == analysis_types[0])):
+                                    analysis_response = st.session_state.analysis_cache.get((active_commodity, t, data_version))
+                                    if analysis_response is not None:
+                                        st.markdown(analysis_response['content'])
+                                        st.caption(
+                                            f"Tokens: {analysis_response['usage']['total_tokens']} · "
+                                            f"Estimated cost: {analysis_response['usage']['estimated_cost']}"
+                                        )
+                                    else:
+                                        st.error(results.get(t, "Analysis unavailable"))
+                        else:
+                            # Reuse the analysis if this commodity/type/data was already analyzed, otherwise stream it from ChatGPT
+                            analysis_key = (active_commodity, active_type, data_version)
+                            analysis_response = st.session_state.analysis_cache.get(analysis_key)
+                            if analysis_response is not None:
+                                st.markdown(analysis_response['content'])
+                            else:
+                                usage = {}
+                                content = st.write_stream(get_commodity_analysis_stream(
+                                    client, 
+                                    commodity_data, 
+                                    active_commodity,
+                                    active_type,
+                                    usage=usage
+                                ))
+                                analysis_response = {'content': content, 'usage': usage}
+                                # Usage only arrives once the stream completes without errors
+                                if usage:
+                                    st.session_state.analysis_cache[analysis_key] = analysis_response
+
+                            if analysis_response['usage']:
+                                # Create a container for token usage
+                                token_container = st.container()
+
+                                # Display token usage metrics
+                                token_container.markdown("### 📊 Token Usage")
+                                cols = token_container.columns(4)
+
+                                # Display metrics in columns
+                                cols[0].metric(
+                                    "Prompt Tokens",
+                                    analysis_response['usage']['prompt_tokens']
+                                )
+                                cols[1].metric(
+                                    "Completion Tokens",
+                                    analysis_response['usage']['completion_tokens']
+                                )
+                                cols[2].metric(
+                                    "Total Tokens",
+                                    analysis_response['usage']['total_tokens']
+                                )
+                                cols[3].metric(
+                                    "Estimated Cost",
+                                    analysis_response['usage']['estimated_cost']
+                                )
+
+                                # Add a divider
+                                st.markdown("---")
+
+                    elif view == "📈 Data":
+                        # Show recent price data
+                        st.markdown("### Recent Price Data")
+                        # Rows are already in Date order (see load_shared_data), so just reverse the last ten
+                        recent_data = commodity_data.iloc[-10:].iloc[::-1]
+
+                        # Get available columns
+                        available_columns = ['Price']
+                        for col in ['%Day', '%Week', '%Month', '%YTD']:
+                            if col in recent_data.columns:
+                                available_columns.append(col)
+
+                        # Keep the columns numeric and let the Styler format them for display
+                        formats = {col: "{:.2%}" for col in available_columns if col.startswith('%')}
+                        formats['Price'] = "${:.2f}"
+                        st.dataframe(
+                            recent_data[available_columns].style.format(formats, na_rep="N/A"),
+                            use_container_width=True
+                        )
+
+                        # Show basic statistics
+                        st.markdown("### Basic Statistics")
+                        row = build_commodity_stats(df_data, data_version).loc[active_commodity]
+                        stats = pd.DataFrame({
+                            'Metric': [
+                                'Current Price',
+                                'Average Price',
+                                'Std Dev',
+                                'Min Price',
+                                'Max Price',
+                                'Price Volatility'
+                            ],
+                            'Value': [
+                                f"${row['Current']:.2f}",
+                                f"${row['mean']:.2f}",
+                                f"${row['std']:.2f}",
+                                f"${row['min']:.2f}",
+                                f"${row['max']:.2f}",
+                                f"{(row['std'] / row['mean']):.2%}"
+                            ]
+                        })
+                        st.dataframe(stats, use_container_width=True)
+
+                    else:
+                        # Create price chart with moving averages
+                        st.markdown("### Price Chart with Moving Averages")
+                        fig = build_price_figure(commodity_data, active_commodity, data_version, hide_gaps)
+                        st.plotly_chart(
+                            fig,
+                            use_container_width=True,
+                            config={"scrollZoom": True, "responsive": True, "displaylogo": False}
+                        )
+
+                else:
+                    st.error("No data available for selected commodity")
+
+
+@st.fragment
+def render_chat_tab(df_data):
+    """Chat with the commodity expert using the latest prices as context"""
+    st.subheader("Chat with Commodity Expert")
+
+    # Initialize chat history, plus a running summary of turns that have left the history window
+    if "messages" not in st.session_state:
+        st.session_state.messages = []
+        st.session_state.chat_summary = None
+        st.session_state.chat_summarized = 0
+
+    # Display chat history
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+    # Chat input
+    if prompt := st.chat_input("Ask about commodity markets..."):
+        # Send only the recent turns; once they pile up, fold the older ones into the summary
+        history = st.session_state.messages[st.session_state.chat_summarized:]
+        if len(history) > 16:
+            older = history[:-8]
+            summary = summarize_chat_history(client, older, st.session_state.chat_summary)
+            # A failed summary comes back as the previous one; the older turns are then sent as they are
+            if summary is not st.session_state.chat_summary:
+                st.session_state.chat_summary = summary
+                st.session_state.chat_summarized += len(older)
+                history = history[-8:]
+        if st.session_state.chat_summary:
+            history = [{"role": "system", "content": f"Summary of the earlier conversation: {st.session_state.chat_summary}"}] + history
+
+        # Display user message
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        # Add user message to chat history
+        st.session_state.messages.append({"role": "user", "content": prompt})
+
+        # Get context from current commodity data
+        context = build_chat_context(df_data, latest_date)
+
+        # Stream the response from ChatGPT, reusing answers to the same question on the same data
+        # at the same point of the conversation; history already carries the running summary
+        chat_key = (prompt, hash(context), hash(tuple((m["role"], m["content"]) for m in history)))
+        with st.chat_message("assistant"):
+            response = st.session_state.chat_cache.get(chat_key)
+            if response is not None:
+                st.markdown(response)
+            else:
+                response = st.write_stream(chat_with_commodity_expert_stream(client, prompt, context, history))
+                if not response.startswith("Error"):
+                    st.session_state.chat_cache[chat_key] = response
+
+        # Add assistant response to chat history
+        st.session_state.messages.append({"role": "assistant", "content": response})
 
-# Sidebar options
-st.sidebar.markdown("### 📊 Chart Options")
-hide_gaps = st.sidebar.checkbox("Hide non-trading gaps", value=True)
 
 if df_data is not None and df_list is not None:
     # Create two tabs
     tab1, tab2 = st.tabs(["📊 Commodity Analysis", "💬 Chat with Expert"])
     
     with tab1:
-        st.subheader("AI-Powered Commodity Analysis")
-        
-        # Create two columns for layout
-        col1, col2 = st.columns([1, 2])
-        
-        with col1:
-            # Commodity selector
-            available_commodities = sorted(df_data['Commodities'].unique())
-            selected_commodity = st.selectbox(
-                "Select a commodity",
-                options=available_commodities
-            )
-            
-            # Analysis type selector
-            analysis_type = st.radio(
-                "Analysis Type",
-                ["comprehensive", "technical", "risk"],
-                format_func=lambda x: x.title()
-            )
-            
-            generate_button = st.button("🔄 Generate Analysis", use_container_width=True)
-            
-            # Add save to PDF button (placeholder for future feature)
-            if st.button("💾 Save Analysis", use_container_width=True):
-                st.info("PDF export feature coming soon!")
-        
-        with col2:
-            if generate_button:
-                with st.spinner("Analyzing data..."):
-                    # Get data for selected commodity
-                    commodity_data = df_data[df_data['Commodities'] == selected_commodity].copy()
-                    
-                    if not commodity_data.empty:
-                        # Create tabs for different views
-                        analysis_tab, data_tab, viz_tab = st.tabs(["📊 Analysis", "📈 Data", "🔍 Visualization"])
-                        
-                        with analysis_tab:
-                            # Get analysis from ChatGPT
-                            analysis_response = get_commodity_analysis(
-                                client, 
-                                commodity_data, 
-                                selected_commodity,
-                                analysis_type
-                            )
-                            
-                            if isinstance(analysis_response, dict):
-                                if 'error' in analysis_response:
-                                    st.error(analysis_response['error'])
-                                else:
-                                    # Display analysis in a nice format
-                                    st.markdown("### Analysis Results")
-                                    st.markdown(analysis_response['content'])
-                                    
-                                    # Create a container for token usage
-                                    token_container = st.container()
-                                    
-                                    # Display token usage metrics
-                                    token_container.markdown("### 📊 Token Usage")
-                                    cols = token_container.columns(4)
-                                    
-                                    # Display metrics in columns
-                                    cols[0].metric(
-                                        "Prompt Tokens",
-                                        analysis_response['usage']['prompt_tokens']
-                                    )
-                                    cols[1].metric(
-                                        "Completion Tokens",
-                                        analysis_response['usage']['completion_tokens']
-                                    )
-                                    cols[2].metric(
-                                        "Total Tokens",
-                                        analysis_response['usage']['total_tokens']
-                                    )
-                                    cols[3].metric(
-                                        "Estimated Cost",
-                                        analysis_response['usage']['estimated_cost']
-                                    )
-                                    
-                                    # Add a divider
-                                    st.markdown("---")
-                            else:
-                                # Display error message
-                                st.error(f"Unexpected response format: {analysis_response}")
-                        
-                        with data_tab:
-                            # Show recent price data
-                            st.markdown("### Recent Price Data")
-                            recent_data = commodity_data.tail(10).sort_index(ascending=False)
-                            
-                            # Get available columns
-                            available_columns = ['Date', 'Price']
-                            for col in ['%Day', '%Week', '%Month', '%YTD']:
-                                if col in recent_data.columns:
-                                    available_columns.append(col)
-                            
-                            # Format the data for display
-                            display_data = recent_data[available_columns].copy()
-                            
-                            # Format percentage columns
-                            for col in available_columns:
-                                if col.startswith('%'):
-                                    display_data[col] = display_data[col].apply(lambda x: f"{x:.2%}" if pd.notnull(x) else "N/A")
-                                elif col == 'Price':
-                                    display_data[col] = display_data[col].apply(lambda x: f"${x:.2f}" if pd.notnull(x) else "N/A")
-                            
-                            st.dataframe(display_data, use_container_width=True)
-                            
-                            # Show basic statistics
-                            st.markdown("### Basic Statistics")
-                            stats = pd.DataFrame({
-                                'Metric': [
-                                    'Current Price',
-                                    'Average Price',
-                                    'Std Dev',
-                                    'Min Price',
-                                    'Max Price',
-                                    'Price Volatility'
-                                ],
-                                'Value': [
-                                    f"${commodity_data['Price'].iloc[-1]:.2f}",
-                                    f"${commodity_data['Price'].mean():.2f}",
-                                    f"${commodity_data['Price'].std():.2f}",
-                                    f"${commodity_data['Price'].min():.2f}",
-                                    f"${commodity_data['Price'].max():.2f}",
-                                    f"{(commodity_data['Price'].std() / commodity_data['Price'].mean()):.2%}"
-                                ]
-                            })
-                            st.dataframe(stats, use_container_width=True)
-                        
-                        with viz_tab:
-                            # Create price chart with moving averages
-                            st.markdown("### Price Chart with Moving Averages")
-                            
-                            # Calculate moving averages
-                            commodity_data['MA20'] = commodity_data['Price'].rolling(window=20).mean()
-                            commodity_data['MA50'] = commodity_data['Price'].rolling(window=50).mean()
-                            
-                            # Create the chart using Plotly
-                            import plotly.graph_objects as go
-                            from plotly.subplots import make_subplots
-                            
-                            fig = make_subplots(rows=2, cols=1, 
-                                              shared_xaxes=True,
-                                              vertical_spacing=0.03,
-                                              row_heights=[0.7, 0.3])
-                            
-                            # Price and MA lines
-                            fig.add_trace(
-                                go.Scatter(x=commodity_data['Date'], 
-                                         y=commodity_data['Price'],
-                                         name='Price',
-                                         line=dict(color='#2563eb')),
-                                row=1, col=1
-                            )
-                            
-                            fig.add_trace(
-                                go.Scatter(x=commodity_data['Date'],
-                                         y=commodity_data['MA20'],
-                                         name='20-day MA',
-                                         line=dict(color='#f59e0b',
-                                                 dash='dash')),
-                                row=1, col=1
-                            )
-                            
-                            fig.add_trace(
-                                go.Scatter(x=commodity_data['Date'],
-                                         y=commodity_data['MA50'],
-                                         name='50-day MA',
-                                         line=dict(color='#10b981',
-                                                 dash='dash')),
-                                row=1, col=1
-                            )
-                            
-                            # Add daily returns
-                            commodity_data['Returns'] = commodity_data['Price'].pct_change()
-                            fig.add_trace(
-                                go.Bar(x=commodity_data['Date'],
-                                      y=commodity_data['Returns'],
-                                      name='Daily Returns',
-                                      marker_color='#3b82f6'),
-                                row=2, col=1
-                            )
-                            
-                            fig.update_layout(
-                                height=600,
-                                title=f"{selected_commodity} Price Analysis",
-                                showlegend=True,
-                                legend=dict(
-                                    yanchor="top",
-                                    y=0.99,
-                                    xanchor="left",
-                                    x=0.01
-                                )
-                            )
-                            
-                            fig.update_yaxes(title_text="Price ($)", row=1, col=1)
-                            fig.update_yaxes(title_text="Returns (%)", row=2, col=1)
-                            # Shorter date labels and optional weekend breaks
-                            fig.update_xaxes(tickformat='%b %y', tickangle=-30)
-                            if hide_gaps:
-                                fig.update_xaxes(rangebreaks=[dict(bounds=["sat", "mon"])])
-                            
-                            st.plotly_chart(fig, use_container_width=True, config={"scrollZoom": True})
-                            
-                    else:
-                        st.error("No data available for selected commodity")
+        render_analysis_tab(df_data)
     
     with tab2:
-        st.subheader("Chat with Commodity Expert")
-        
-        # Initialize chat history
-        if "messages" not in st.session_state:
-            st.session_state.messages = []
-
-        # Display chat history
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-
-        # Chat input
-        if prompt := st.chat_input("Ask about commodity markets..."):
-            # Display user message
-            with st.chat_message("user"):
-                st.markdown(prompt)
-            
-            # Add user message to chat history
-            st.session_state.messages.append({"role": "user", "content": prompt})
-            
-            # Get context from current commodity data
-            latest_data = df_data[df_data['Date'] == df_data['Date'].max()].copy()
-            context = f"""
-            Latest commodity prices and changes:
-            {latest_data[['Commodities', 'Price', '%Day']].to_string()}
-            """
-            
-            # Get response from ChatGPT
-            with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    response = chat_with_commodity_expert(client, prompt, context)
-                    st.markdown(response)
-            
-            # Add assistant response to chat history
-            st.session_state.messages.append({"role": "assistant", "content": response})
+        render_chat_tab(df_data)
 
 else:
     st.error("Failed to load data. Please check your data files.")
@@ -1,15 +1,720 @@
+import hashlib
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from modules.data_loader import load_data
-from modules.calculations import calculate_price_changes
+from modules.calculations import calculate_price_changes, lttb_indices, macd_lines, rolling_mean, rolling_means, rsi, steel_costs_profits
 from modules.styling import configure_page_style
 from modules.stock_data import fetch_multiple_stocks
 from modules.news_crawler import get_steel_news
 from modules.steel_volumes import render_steel_volumes_section  # Add volumes analysis
 
+
+@st.cache_data(show_spinner=False)
+def build_price_pivot(_df_data, data_version):
+    """Date x commodity price pivot with the 30-day input MAs, production cost and profit per ton"""
+    # Create price pivot table for the entire dataset
+    # Date is already datetime64 from load_data, so the pivot index needs no conversion
+    price_pivot = _df_data.pivot(index='Date', columns='Commodities', values='Price')
+
+    # All five steel prices pulled out in one NumPy block; inputs are ore, coal and scrap, outputs HRC and long steel
+    steel_prices = price_pivot[['Ore 62', 'Aus Met Coal', 'Scrap', 'China HRC', 'China Long steel']].to_numpy(dtype=np.float64)
+    input_prices, output_prices = steel_prices[:, :3], steel_prices[:, 3:]
+
+    # 30-day moving averages of the inputs, computed for all three columns at once
+    input_mas = rolling_mean(input_prices, 30, min_periods=1)
+
+    # Raw material cost from the input MAs, plus depreciation (850k VND/ton ≈ 35 USD/ton)
+    # and SGA (450k VND/ton ≈ 19 USD/ton); profits are against spot output prices, pre and after 12% tax
+    costs = steel_costs_profits(input_mas, output_prices, depreciation=35, sga=19)
+
+    # Write everything back to the pivot in a single assignment
+    price_pivot = price_pivot.assign(
+        Ore_30d_MA=input_mas[:, 0],
+        Coal_30d_MA=input_mas[:, 1],
+        Scrap_30d_MA=input_mas[:, 2],
+        Depreciation=35,
+        SGA=19,
+        **costs
+    )
+    
+    return price_pivot
+
+
+@st.cache_data(show_spinner=False)
+def steel_price_changes(_df_data, _df_list, latest_date, data_version):
+    """Price changes of every commodity as of latest_date, cached on the data version rather than on the frames' contents"""
+    return calculate_price_changes(_df_data, _df_list, latest_date)
+
+
+@st.cache_data(show_spinner=False)
+def load_volumes():
+    """Monthly steel sales volumes by product and producer, indexed by Date"""
+    return pd.read_csv('data/steel_volumes.csv', parse_dates=['Date'], index_col='Date')
+
+
+# VND per USD used to convert HPG's profits, by year
+FX_RATES = {
+    2023: 23500,
+    2024: 24000,
+    2025: 25300
+}
+
+
+def fx_rates_for(years):
+    """VND/USD rate of each year, gathered from a year-indexed array; years outside FX_RATES use the nearest year's rate"""
+    first_year = min(FX_RATES)
+    rates_by_year = np.array([FX_RATES[year] for year in range(first_year, max(FX_RATES) + 1)])
+    return rates_by_year[np.clip(np.asarray(years) - first_year, 0, len(rates_by_year) - 1)]
+
+
+@st.cache_data(show_spinner=False)
+def build_profit_frames(_price_pivot, _volumes_df, data_version):
+    """HPG NPAT in USD by month and by calendar quarter, each with the VND/USD rate that applies to it"""
+    # Align the price pivot with the months that have HPG volumes
+    common_index = _price_pivot.index.intersection(_volumes_df.index)
+    profit_pivot = _price_pivot.loc[common_index].copy()
+    hpg_rebar = _volumes_df['Rebar - HPG'].loc[common_index]
+    hpg_coil = _volumes_df['Coil - HPG'].loc[common_index]
+    
+    # Calculate total NPAT by product
+    profit_pivot['HRC_NPAT'] = profit_pivot['HRC_Profit'] * hpg_coil
+    profit_pivot['Long_Steel_NPAT'] = profit_pivot['Long_Steel_Profit'] * hpg_rebar
+    profit_pivot['Total_NPAT'] = profit_pivot['HRC_NPAT'] + profit_pivot['Long_Steel_NPAT']
+    
+    # FX rate of each row's year
+    profit_pivot['fx_rate'] = fx_rates_for(profit_pivot.index.year.to_numpy())
+    
+    # Calculate quarterly profits per calendar quarter, keeping the same quarter of different years apart,
+    # along with the average FX rate of each quarter
+    quarters = profit_pivot.index.to_period('Q')
+    quarterly_profits = profit_pivot[['HRC_NPAT', 'Long_Steel_NPAT', 'Total_NPAT']].groupby(quarters).sum()
+    quarterly_profits['fx_rate'] = profit_pivot['fx_rate'].groupby(quarters).mean()
+    
+    return profit_pivot, quarterly_profits
+
+
+# Runs as a fragment, so switching the currency only reruns this section
+@st.fragment
+def render_profit_summary(profit_pivot, quarterly_profits):
+    """Currency selector, current month/quarter/YTD profit metrics and the quarterly profit chart for HPG"""
+    # Add currency selection
+    currency = st.selectbox(
+        "Select Currency",
+        ["USD", "VND (billion)"],
+        key="profit_currency"
+    )
+    
+    # Convert to VND billion if selected, using the average FX rate of each quarter
+    if currency == "VND (billion)":
+        quarterly_scale = quarterly_profits['fx_rate'] / 1e9
+        currency_label = "Profit (VND billion)"
+    else:
+        quarterly_scale = 1
+        currency_label = "Profit (USD)"
+    quarter_labels = quarterly_profits.index.astype(str)
+    
+    # Create quarterly profit chart
+    quarterly_profit_fig = go.Figure()
+    quarterly_profit_fig.add_traces([
+        go.Bar(
+            name='HRC Profit',
+            x=quarter_labels,
+            y=(quarterly_profits['HRC_NPAT'] * quarterly_scale).to_numpy(dtype=np.float32),
+            marker_color='rgb(55, 83, 109)'
+        ),
+        go.Bar(
+            name='Long Steel Profit',
+            x=quarter_labels,
+            y=(quarterly_profits['Long_Steel_NPAT'] * quarterly_scale).to_numpy(dtype=np.float32),
+            marker_color='rgb(26, 118, 255)'
+        )
+    ])
+    
+    quarterly_profit_fig.update_layout(
+        title='HPG Quarterly Profit Breakdown',
+        xaxis_title='Quarter',
+        yaxis_title=currency_label,
+        barmode='stack',
+        showlegend=True,
+        template='plotly_white'
+    )
+
+    # Display total profit for the current period
+    current_month = profit_pivot.index[-1]
+    current_quarter = current_month.quarter
+    current_year = current_month.year
+    
+    # Create three columns for metrics
+    col1, col2, col3 = st.columns(3)
+    
+    # Current profits and rates, read once for both currency branches
+    month_total = float(profit_pivot['Total_NPAT'].iat[-1])
+    current_fx_rate = float(profit_pivot['fx_rate'].iat[-1])
+    quarter_total = float(quarterly_profits['Total_NPAT'].iat[-1])
+    quarter_fx_rate = float(quarterly_profits['fx_rate'].iat[-1])
+    
+    with col1:
+        st.markdown("### Current Month")
+        if currency == "VND (billion)":
+            st.metric("Profit", f"{month_total * current_fx_rate / 1e9:,.1f} VND bn")
+            # Also show USD value for reference
+            st.metric("USD Equivalent", f"${month_total:,.0f}")
+        else:
+            st.metric("Profit", f"${month_total:,.0f}")
+            # Show VND value for reference
+            st.metric("VND Equivalent", f"{month_total * current_fx_rate / 1e9:,.1f} bn")
+    
+    with col2:
+        st.markdown(f"### Q{current_quarter}")
+        if currency == "VND (billion)":
+            st.metric("Profit", f"{quarter_total * quarter_fx_rate / 1e9:,.1f} VND bn")
+            st.metric("USD Equivalent", f"${quarter_total:,.0f}")
+        else:
+            st.metric("Profit", f"${quarter_total:,.0f}")
+            st.metric("VND Equivalent", f"{quarter_total * quarter_fx_rate / 1e9:,.1f} bn")
+    
+    with col3:
+        st.markdown("### Year to Date")
+        # One mask over the index, applied to both columns' arrays
+        year_mask = profit_pivot.index.year.to_numpy() == current_year
+        ytd_total_usd = np.nansum(profit_pivot['Total_NPAT'].to_numpy()[year_mask])
+        ytd_avg_fx = np.nanmean(profit_pivot['fx_rate'].to_numpy()[year_mask])
+        if currency == "VND (billion)":
+            ytd_total_vnd = ytd_total_usd * ytd_avg_fx / 1e9
+            st.metric("Profit", f"{ytd_total_vnd:,.1f} VND bn")
+            st.metric("USD Equivalent", f"${ytd_total_usd:,.0f}")
+        else:
+            st.metric("Profit", f"${ytd_total_usd:,.0f}")
+            st.metric("VND Equivalent", f"{ytd_total_usd * ytd_avg_fx / 1e9:,.1f} bn")
+    
+    # Display the quarterly profit chart; the stable key lets Streamlit update the chart in place
+    st.plotly_chart(quarterly_profit_fig, use_container_width=True, key="quarterly_profit_chart")
+
+
+def perf_period_starts(latest_date):
+    """Week, month and year start dates for the WTD/MTD/YTD changes, anchored on the latest date in the window"""
+    return {
+        'WTD': latest_date - pd.Timedelta(days=latest_date.weekday()),
+        'MTD': pd.Timestamp(latest_date.year, latest_date.month, 1),
+        'YTD': pd.Timestamp(latest_date.year, 1, 1)
+    }
+
+
+def perf_table(pivot, commodities, period_starts):
+    """Current price and WTD/MTD/YTD % change for each commodity, measured from the first price on or after each period start, indexed by commodity"""
+    prices = pivot[commodities].dropna(how='all')
+    if prices.empty:
+        return pd.DataFrame()
+    
+    latest = prices.ffill().iloc[-1]
+    # Backfilled once, so each period's start prices are one binary search on the dates and one row read
+    backfilled = prices.bfill().to_numpy()
+    table = pd.DataFrame({'Current Price': latest})
+    for label, period_start in period_starts.items():
+        start_price = pd.Series(backfilled[prices.index.searchsorted(period_start)], index=prices.columns).fillna(latest)
+        table[label] = (latest - start_price) / start_price * 100
+    
+    # Commodities with no prices in the window are left out
+    table = table[latest.notna()]
+    return table.rename_axis('Commodity')
+
+
+def perf_table_html(table):
+    """Render a performance table as HTML with striped rows and changes colored by sign"""
+    header = ''.join(f"<th style='text-align: left; padding: 0.4rem;'>{col}</th>" for col in table.columns)
+    # Color every change cell at once by the value as displayed, so changes that round to 0.0% stay gray
+    changes = table.iloc[:, 2:].to_numpy(dtype=np.float64)
+    shown = np.round(changes, 1)
+    colors = np.select([shown > 0, shown < 0], ['#16a34a', '#dc2626'], '#6b7280')
+    rows = []
+    for i, (commodity, price) in enumerate(zip(table['Commodity'], table['Current Price'])):
+        cells = [f"<td style='padding: 0.4rem;'>{commodity}</td>", f"<td style='padding: 0.4rem;'>${price:.2f}</td>"]
+        cells += [f"<td style='padding: 0.4rem; color: {color};'>{change:+.1f}%</td>" for change, color in zip(changes[i], colors[i])]
+        background = " style='background-color: #f8f9fa;'" if i % 2 == 0 else ''
+        rows.append(f"<tr{background}>{''.join(cells)}</tr>")
+    return (
+        "<table style='width: 100%; border-collapse: collapse; margin-bottom: 1rem;'>"
+        f"<thead><tr>{header}</tr></thead><tbody>{''.join(rows)}</tbody></table>"
+    )
+
+
+def banded_rows(frame):
+    """Cell styles that shade every other row of a Styler's frame, built for the whole table at once"""
+    shade = np.where(np.arange(len(frame)) % 2 == 0, 'background-color: #f8f9fa', '')
+    return pd.DataFrame(np.repeat(shade[:, None], frame.shape[1], axis=1), index=frame.index, columns=frame.columns)
+
+
+@st.cache_data(show_spinner=False)
+def price_changes_html(_changes, commodities, data_version):
+    """Price changes table of the given commodities as static HTML, with the changes as percentages and shaded alternate rows"""
+    change_columns = [col for col in _changes.columns if col != 'Commodities']
+    styler = (
+        _changes.style
+        .format({col: "{:.2%}" for col in change_columns}, na_rep="N/A")
+        .apply(banded_rows, axis=None)
+        .hide(axis='index')
+        .set_table_styles([{'selector': 'th, td', 'props': 'text-align: left; padding: 0.4rem;'}])
+        .set_table_attributes("style='width: 100%; border-collapse: collapse; margin-bottom: 1rem;'")
+        # A fixed id keeps the HTML, and so the rendered element, the same across reruns
+        .set_uuid('price_changes')
+    )
+    return styler.to_html()
+
+
+# Period codes used to aggregate the price charts at coarser intervals
+INTERVAL_PERIODS = {'Weekly': 'W', 'Monthly': 'M', 'Quarterly': 'Q'}
+
+
+@st.cache_data(show_spinner=False)
+def commodity_slices(_df_data, commodities, start_ts, end_ts, data_version):
+    """Date-sorted Date/Price rows of each commodity within the date range, keyed by commodity"""
+    # load_data sorts the rows by Date, so the date range is two binary searches and a positional slice
+    dates = _df_data['Date'].to_numpy()
+    lo = np.searchsorted(dates, start_ts.to_datetime64(), side='left')
+    hi = np.searchsorted(dates, end_ts.to_datetime64(), side='right')
+    window = _df_data.iloc[lo:hi]
+    window = window.loc[window['Commodities'].isin(commodities), ['Commodities', 'Date', 'Price']]
+    return {
+        commodity: rows[['Date', 'Price']].reset_index(drop=True)
+        for commodity, rows in window.groupby('Commodities', observed=True)
+    }
+
+
+@st.cache_data(show_spinner=False)
+def aggregate_prices(_slices, interval, start_ts, end_ts, data_version):
+    """Per-commodity price series at the chosen interval, keeping the last price of each period dated at the period end"""
+    series = {}
+    if interval not in INTERVAL_PERIODS:
+        # Daily lines keep every price unless the window is long enough to need LTTB thinning
+        for commodity, rows in _slices.items():
+            dates, prices = downsample_series(rows['Date'].to_numpy(), rows['Price'].to_numpy())
+            series[commodity] = rows if len(prices) == len(rows) else pd.DataFrame({'Date': dates, 'Price': prices})
+        return series
+    for commodity, rows in _slices.items():
+        period_prices = rows.groupby(rows['Date'].dt.to_period(INTERVAL_PERIODS[interval]))['Price'].last()
+        series[commodity] = pd.DataFrame({'Date': period_prices.index.end_time, 'Price': period_prices.to_numpy()})
+    return series
+
+
+def downsample_series(dates, values, max_points=2000, n_out=1500):
+    """Dates and values of a line thinned with LTTB to n_out points once it is longer than max_points"""
+    if len(values) <= max_points:
+        return dates, values
+    keep = lttb_indices(dates.astype('int64'), values, n_out)
+    return dates[keep], values[keep]
+
+
+# Lines with fewer points than this are drawn as SVG; longer ones use WebGL
+WEBGL_MIN_POINTS = 500
+
+
+def line_trace_type(n_points, hide_gaps=False):
+    """Trace class for a line chart: WebGL for long series, SVG for short ones and for axes with rangebreaks, which hide scattergl traces"""
+    return go.Scatter if hide_gaps or n_points < WEBGL_MIN_POINTS else go.Scattergl
+
+
+# Input and output price sections: header text, commodity selector, and the price grid's line color,
+# subplot spacing, top margin, extra height and whether its subplots share one price range
+PRICE_SECTIONS = {
+    'inputs': dict(
+        title='Input Materials', description='Raw materials used in steel production',
+        prompt='Select input materials to display:', key='input_commodities',
+        color='#4ade80', vertical_spacing=0.2, horizontal_spacing=0.15, top_margin=80, extra_height=100, shared_range=False
+    ),
+    'outputs': dict(
+        title='Output Products', description='Finished steel products',
+        prompt='Select output products to display:', key='output_commodities',
+        color='#f87171', vertical_spacing=0.12, horizontal_spacing=0.1, top_margin=40, extra_height=0, shared_range=True
+    )
+}
+
+
+@st.cache_data(show_spinner=False)
+def build_price_grid(_interval_series, _price_extremes, commodities, section, interval, start_date, end_date, hide_gaps, data_version):
+    """Two-column grid of price charts for one section; inputs get their own padded price ranges, outputs share one"""
+    style = PRICE_SECTIONS[section]
+    
+    # Calculate number of rows needed for the charts
+    num_rows = (len(commodities) + 1) // 2
+    
+    fig = make_subplots(
+        rows=num_rows,
+        cols=2,
+        subplot_titles=commodities,
+        vertical_spacing=style['vertical_spacing'],
+        horizontal_spacing=style['horizontal_spacing']
+    )
+    
+    # Price ranges with 5% padding: one shared across the grid, or one per commodity due to different price scales
+    extremes = _price_extremes.reindex(commodities).dropna()
+    shared_range = None
+    if style['shared_range']:
+        shared_range = [
+            extremes['min'].min() * 0.95 if not extremes.empty else 0,
+            extremes['max'].max() * 1.05 if not extremes.empty else 100
+        ]
+    
+    # Create individual charts, collected with their grid cells and added in one batch
+    longest = max((len(_interval_series[c]) for c in commodities if c in _interval_series), default=0)
+    line_trace = line_trace_type(longest, hide_gaps)
+    traces, trace_rows, trace_cols = [], [], []
+    axis_ranges = {}
+    for i, commodity in enumerate(commodities):
+        row = (i // 2) + 1
+        col = (i % 2) + 1
+        
+        aggregated_data = _interval_series.get(commodity)
+        
+        if aggregated_data is not None:
+            
+            traces.append(
+                line_trace(
+                    x=aggregated_data['Date'],
+                    y=aggregated_data['Price'],
+                    mode='lines',
+                    name=commodity,
+                    line=dict(color=style['color'], width=2),
+                    hovertemplate=f'Date: %{{x}}<br>Price: ${{"y:.2f"}}<extra></extra>',
+                    showlegend=False
+                )
+            )
+            trace_rows.append(row)
+            trace_cols.append(col)
+            
+            # Without a shared range, each commodity gets its own, set on its subplot's y-axis (yaxis, yaxis2, ...)
+            if not style['shared_range']:
+                if commodity in extremes.index:
+                    y_range = [extremes.at[commodity, 'min'] * 0.95, extremes.at[commodity, 'max'] * 1.05]
+                else:
+                    y_range = [0, 100]
+                axis_ranges[f"yaxis{i + 1 if i else ''}_range"] = y_range
+    
+    fig.add_traces(traces, rows=trace_rows, cols=trace_cols)
+    
+    height_per_row = 300
+    total_height = num_rows * height_per_row
+    
+    # Shared axis styling applied to every subplot at once, with shorter date labels and optional weekend breaks
+    fig.update_xaxes(
+        title_text="Date",
+        showgrid=True,
+        gridwidth=1,
+        gridcolor='rgba(0,0,0,0.1)',
+        showline=True,
+        linewidth=1,
+        linecolor='rgba(0,0,0,0.2)',
+        tickformat='%b %y',
+        tickangle=-30,
+        rangebreaks=[dict(bounds=["sat", "mon"])] if hide_gaps else None
+    )
+    fig.update_yaxes(
+        title_text="Price ($)",
+        showgrid=True,
+        gridwidth=1,
+        gridcolor='rgba(0,0,0,0.1)',
+        showline=True,
+        linewidth=1,
+        linecolor='rgba(0,0,0,0.2)',
+        range=shared_range
+    )
+    # Per-commodity ranges go in with the layout, after the shared axis styling
+    fig.update_layout(
+        template="plotly_white",
+        height=total_height + style['extra_height'],
+        margin=dict(l=50, r=50, t=style['top_margin'], b=50),
+        font=dict(family="Manrope, sans-serif", size=12),
+        showlegend=False,
+        hovermode='x unified',
+        **axis_ranges
+    )
+    # The spare cell of an odd-sized grid has no chart, so keep its axes hidden
+    if len(commodities) % 2:
+        fig.update_xaxes(visible=False, row=num_rows, col=2)
+        fig.update_yaxes(visible=False, row=num_rows, col=2)
+    
+    return fig
+
+
+def render_price_section(section, options, performance, interval_series, price_extremes, interval, start_date, end_date, hide_gaps, data_version):
+    """Header, commodity selector, performance table and price grid of the input or output section; returns the selected commodities"""
+    settings = PRICE_SECTIONS[section]
+    st.markdown(f"""
+        <div style='background-color: #f0f7f4; padding: 1rem; border-radius: 0.5rem; margin-bottom: 1rem;'>
+            <h4 style='margin:0; color: #00816D;'>{settings['title']}</h4>
+            <p>{settings['description']}</p>
+        </div>
+    """, unsafe_allow_html=True)
+    
+    selected = st.multiselect(
+        settings['prompt'],
+        options=options,
+        default=options,
+        key=settings['key']
+    )
+
+    # Display the section's Performance Table
+    if selected:
+        st.markdown("#### Performance Summary")
+        
+        # Rows of the selected commodities, in the order they were selected
+        df_performance = performance.loc[[c for c in selected if c in performance.index]]
+        if not df_performance.empty:
+            st.markdown(perf_table_html(df_performance.reset_index()), unsafe_allow_html=True)
+        
+        # Display the section's Charts
+        st.markdown("#### Price Charts")
+        fig = build_price_grid(
+            interval_series, price_extremes, selected, section,
+            interval, start_date, end_date, hide_gaps, data_version
+        )
+        
+        st.plotly_chart(fig, use_container_width=True, config={"scrollZoom": True})
+    
+    return selected
+
+
+def stock_data_version(data):
+    """Content hash of a ticker's price history, so its cached chart and indicators refresh whenever any bar changes"""
+    return hashlib.md5(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes()).hexdigest()
+
+
+@st.cache_data(show_spinner=False)
+def compute_indicators(_close, ticker, data_version, ma_windows, want_macd, want_rsi):
+    """Moving averages, MACD lines and RSI(14) of a ticker's closing prices, as float32 arrays for plotting"""
+    close = _close.to_numpy(dtype=np.float64)
+    
+    # All selected MAs come from one pass of cumulative sums over the closes
+    indicators = {'ma': {window: ma.astype(np.float32) for window, ma in rolling_means(close, ma_windows, min_periods=1).items()}}
+    if want_macd:
+        indicators['macd'] = tuple(line.astype(np.float32) for line in macd_lines(close))
+    if want_rsi:
+        indicators['rsi'] = rsi(close, 14).astype(np.float32)
+    return indicators
+
+
+# Shared layouts of the profit-per-ton/margin charts and the stock charts
+PROFIT_LAYOUT = dict(
+    height=400,
+    template='plotly_white',
+    margin=dict(l=50, r=50, t=20, b=50),
+    font=dict(family="Manrope, sans-serif", size=12),
+    showlegend=True,
+    legend=dict(
+        orientation="h",
+        yanchor="bottom",
+        y=1.02,
+        xanchor="right",
+        x=1
+    ),
+    hovermode='x unified',
+    xaxis_title="Date"
+)
+CANDLE_LAYOUT = dict(
+    height=520,
+    template='plotly_white',
+    margin=dict(l=50, r=50, t=20, b=40),
+    font=dict(family="Manrope, sans-serif", size=12),
+    showlegend=False,
+    hovermode='x unified',
+    dragmode='pan',
+    uirevision='candlestick',
+    xaxis_rangeslider_visible=False,
+    xaxis2_rangeslider_visible=False
+)
+
+# Up/down bar colors for the volume and MACD histogram panels
+VOLUME_UP, VOLUME_DOWN = 'rgba(22, 163, 74, 0.6)', 'rgba(220, 38, 38, 0.6)'
+HIST_UP, HIST_DOWN = 'rgba(34,197,94,0.6)', 'rgba(239,68,68,0.6)'
+
+
+# Tickers with more bars than this are charted with neighbouring bars merged into buckets
+MAX_CANDLES = 1500
+
+
+def merge_bars(data, max_bars=MAX_CANDLES):
+    """
+    OHLCV bars merged into at most max_bars buckets of neighbouring bars, each dated at its last bar,
+    along with the positions of those last bars; data is returned whole when it already fits
+    """
+    if len(data) <= max_bars:
+        return data, slice(None)
+    
+    bucket_size = -(-len(data) // max_bars)
+    aggregations = {'tradingDate': 'last', 'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last'}
+    if 'volume' in data.columns:
+        aggregations['volume'] = 'sum'
+    merged = data.groupby(np.arange(len(data)) // bucket_size).agg(aggregations)
+    bucket_ends = np.minimum(np.arange(1, len(merged) + 1) * bucket_size, len(data)) - 1
+    return merged, bucket_ends
+
+
+# Bounded, since every combination of overlays, gap setting and bar window is a separate entry,
+# and each intraday refresh of a ticker's bars starts a new set
+@st.cache_data(show_spinner=False, max_entries=64)
+def build_ticker_figure(_data, ticker, data_version, selected_ma, selected_ind, hide_gaps, bars_to_show):
+    """Candlestick and volume chart of the last bars_to_show bars of one ticker, with the selected MA overlays and MACD/RSI panels"""
+    # Only the bars in view are sent to the browser, and long windows are charted as merged buckets of bars;
+    # the indicators are computed on the full history and read at each charted bar
+    shown = _data.tail(bars_to_show)
+    first_shown = len(_data) - len(shown)
+    bars, bucket_ends = merge_bars(shown)
+    
+    def charted(line):
+        return line[first_shown:][bucket_ends]
+    
+    line_trace = line_trace_type(len(bars), hide_gaps)
+    
+    # Columns shared by several traces, read once
+    dates = bars['tradingDate']
+    opens, closes = bars['open'].to_numpy(), bars['close'].to_numpy()
+    
+    # Determine subplot structure based on selected indicators
+    rows = 2 + (1 if "MACD" in selected_ind else 0) + (1 if "RSI" in selected_ind else 0)
+    row_heights = [0.6, 0.25]
+    if "MACD" in selected_ind:
+        row_heights.append(0.15)
+    if "RSI" in selected_ind:
+        row_heights.append(0.15)
+
+    fig_candle = make_subplots(
+        rows=rows,
+        cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.03,
+        row_heights=row_heights
+    )
+
+    # Collect the traces and their subplot rows, then add them in one batch
+    traces, trace_rows = [], []
+
+    # Candlestick; prices go to the browser as float32 and volumes as int32 to halve the payload
+    traces.append(
+        go.Candlestick(
+            x=dates,
+            open=opens.astype(np.float32),
+            high=bars['high'].to_numpy(dtype=np.float32),
+            low=bars['low'].to_numpy(dtype=np.float32),
+            close=closes.astype(np.float32),
+            name=ticker,
+            increasing_line_color="#16a34a",
+            decreasing_line_color="#dc2626"
+        )
+    )
+    trace_rows.append(1)
+
+    # Volume bars (colored by up/down day)
+    if 'volume' in bars.columns:
+        # Picked with one vectorized compare; passed as a list since a string array pushes Plotly off its orjson encoder
+        vol_colors = np.where(closes >= opens, VOLUME_UP, VOLUME_DOWN).tolist()
+        traces.append(
+            go.Bar(
+                x=dates,
+                y=bars['volume'].to_numpy(dtype=np.int32),
+                name='Volume',
+                marker_color=vol_colors
+            )
+        )
+        trace_rows.append(2)
+
+    # Indicators depend only on the closes and the selection, so they are cached per ticker
+    indicators = compute_indicators(
+        _data['close'], ticker, data_version,
+        tuple(sorted(int(ma[2:]) for ma in selected_ma)),
+        "MACD" in selected_ind, "RSI" in selected_ind
+    )
+
+    # Moving Averages on price panel
+    moving_averages = indicators['ma']
+    if "MA9" in selected_ma:
+        ma9 = charted(moving_averages[9])
+        traces.append(line_trace(x=dates, y=ma9, name='MA9', line=dict(color='#22c55e', width=1.5)))
+        trace_rows.append(1)
+    if "MA50" in selected_ma:
+        ma50 = charted(moving_averages[50])
+        traces.append(line_trace(x=dates, y=ma50, name='MA50', line=dict(color='#3b82f6', width=1.5)))
+        trace_rows.append(1)
+    if "MA200" in selected_ma:
+        ma200 = charted(moving_averages[200])
+        traces.append(line_trace(x=dates, y=ma200, name='MA200', line=dict(color='#f59e0b', width=1.5)))
+        trace_rows.append(1)
+
+    # Indicators panels
+    current_row = 3
+    if "MACD" in selected_ind:
+        macd, signal, hist = map(charted, indicators['macd'])
+        hist_colors = np.where(hist >= 0, HIST_UP, HIST_DOWN).tolist()
+        traces.append(go.Bar(x=dates, y=hist, marker_color=hist_colors, name='MACD Hist'))
+        traces.append(line_trace(x=dates, y=macd, name='MACD', line=dict(color='#111827', width=1.5)))
+        traces.append(line_trace(x=dates, y=signal, name='Signal', line=dict(color='#f43f5e', width=1.2, dash='dot')))
+        trace_rows += [current_row] * 3
+        fig_candle.update_yaxes(title_text="MACD", row=current_row, col=1)
+        current_row += 1
+    if "RSI" in selected_ind:
+        rsi_line = charted(indicators['rsi'])
+        traces.append(line_trace(x=dates, y=rsi_line, name='RSI(14)', line=dict(color='#06b6d4', width=1.5)))
+        trace_rows.append(current_row)
+        fig_candle.update_yaxes(title_text="RSI", range=[0, 100], row=current_row, col=1)
+
+    fig_candle.add_traces(traces, rows=trace_rows, cols=[1] * len(traces))
+
+    # Overbought/oversold reference lines, drawn as shapes once the RSI panel holds its trace
+    if "RSI" in selected_ind:
+        for level in (70, 30):
+            fig_candle.add_hline(y=level, line=dict(color='rgba(156,163,175,0.7)', width=1, dash='dash'), row=current_row, col=1)
+
+    fig_candle.update_layout(**CANDLE_LAYOUT)
+
+    # Axis titles and short date ticks
+    fig_candle.update_yaxes(title_text="Price (VND)", row=1, col=1)
+    fig_candle.update_yaxes(title_text="Volume", row=2, col=1)
+    # Label bottom-most x-axis only
+    fig_candle.update_xaxes(title_text="Date", tickformat='%b %y', tickangle=-30, row=rows, col=1)
+
+    # Optionally hide weekends and explicitly disable the range slider, on every subplot's x-axis in one call
+    fig_candle.update_xaxes(
+        rangeslider_visible=False,
+        rangebreaks=[dict(bounds=["sat", "mon"])] if hide_gaps else None
+    )
+
+    return fig_candle
+
+
+# Runs as a fragment, so changing the overlays only rebuilds the stock charts
+@st.fragment
+def render_stock_charts(stock_data, steel_companies, hide_gaps):
+    """Candlestick, volume and optional MA/MACD/RSI charts for each steel company, one tab per ticker"""
+    # Technical overlay and indicator controls
+    st.markdown("#### Stock Chart Tools")
+    col_ma, col_ind, col_bars = st.columns(3)
+    with col_ma:
+        ma_options = ["MA9", "MA50", "MA200"]
+        selected_ma = st.multiselect("Moving Averages", options=ma_options, default=["MA50"])
+    with col_ind:
+        ind_options = ["MACD", "RSI"]
+        selected_ind = st.multiselect("Indicators", options=ind_options, default=[])
+    with col_bars:
+        bars_to_show = st.slider("Bars to show", min_value=100, max_value=2000, value=400, step=50)
+
+    # Render candlestick + volume charts per company in tabs
+    tabs = st.tabs(steel_companies)
+    for idx, ticker in enumerate(steel_companies):
+        data = stock_data.get(ticker)
+        if data is None or data.empty:
+            continue
+
+        with tabs[idx]:
+            # Each ticker's figure and indicators are cached on the content of its bars and the chart options;
+            # an intraday refresh changes the last bar without changing its date
+            fig_candle = build_ticker_figure(
+                data, ticker, stock_data_version(data),
+                selected_ma, selected_ind, hide_gaps, bars_to_show
+            )
+            st.plotly_chart(fig_candle, use_container_width=True, config={"scrollZoom": True}, key=f"candle_{ticker}")
+
+
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
     page_title="Steel Industry Analysis",
@@ -36,38 +741,12 @@ st.markdown("""
 df_data, df_list = load_data()
 
 if df_data is not None and df_list is not None:
-    # Create price pivot table for the entire dataset
-    price_pivot = df_data.pivot(index='Date', columns='Commodities', values='Price')
-    price_pivot.index = pd.to_datetime(price_pivot.index)
-
-    # Calculate 30-day moving averages for input materials
-    price_pivot['Ore_30d_MA'] = price_pivot['Ore 62'].rolling(window=30, min_periods=1).mean()
-    price_pivot['Coal_30d_MA'] = price_pivot['Aus Met Coal'].rolling(window=30, min_periods=1).mean()
-    price_pivot['Scrap_30d_MA'] = price_pivot['Scrap'].rolling(window=30, min_periods=1).mean()
+    # load_data sorts the rows by Date, so the data's first and last dates are its first and last rows
+    min_date, max_date = df_data['Date'].iat[0], df_data['Date'].iat[-1]
     
-    # Calculate raw material cost using 30-day moving averages for inputs
-    price_pivot['Raw_Material_Cost'] = (
-        price_pivot['Ore_30d_MA'] * 1.6 +  # Iron ore component (30-day MA)
-        price_pivot['Coal_30d_MA'] * 0.6 +  # Met coal component (30-day MA)
-        price_pivot['Scrap_30d_MA'] * 0.1   # Scrap component (30-day MA)
-    )
-
-    # Add fixed costs
-    price_pivot['Depreciation'] = 35  # 850k VND/ton ≈ 35 USD/ton
-    price_pivot['SGA'] = 19  # 450k VND/ton ≈ 19 USD/ton
-
-    # Calculate total production cost
-    price_pivot['Production_Cost'] = (
-        price_pivot['Raw_Material_Cost'] +
-        price_pivot['Depreciation'] +
-        price_pivot['SGA']
-    )
-
-    # Calculate profits
-    price_pivot['HRC_Profit_PreTax'] = price_pivot['China HRC'] - price_pivot['Production_Cost']
-    price_pivot['Long_Steel_Profit_PreTax'] = price_pivot['China Long steel'] - price_pivot['Production_Cost']
-    price_pivot['HRC_Profit'] = price_pivot['HRC_Profit_PreTax'] * (1 - 0.12)  # After 12% tax
-    price_pivot['Long_Steel_Profit'] = price_pivot['Long_Steel_Profit_PreTax'] * (1 - 0.12)  # After 12% tax
+    # Price pivot with cost/profit columns, rebuilt only when the data changes
+    data_version = str(max_date)
+    price_pivot = build_price_pivot(df_data, data_version)
     
     # Define input and output commodities
     input_commodities = [
@@ -91,9 +770,6 @@ if df_data is not None and df_list is not None:
     st.sidebar.markdown("### 📊 Chart Options")
     
     # Date Range
-    min_date = df_data['Date'].min()
-    max_date = df_data['Date'].max()
-    
     col1, col2 = st.sidebar.columns(2)
     with col1:
         start_date = st.date_input(
@@ -143,397 +819,43 @@ if df_data is not None and df_list is not None:
         </div>
     """, unsafe_allow_html=True)
 
-    # Filter data based on date range
-    date_filtered_data = df_data[
-        (df_data['Date'] >= pd.to_datetime(start_date)) & 
-        (df_data['Date'] <= pd.to_datetime(end_date))
-    ].copy()
+    # The picked dates as Timestamps, converted once for every lookup below
+    start_ts, end_ts = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    
+    # Per-commodity steel prices in the date range, cached so widget reruns skip the filtering
+    steel_slices = commodity_slices(df_data, steel_commodities, start_ts, end_ts, data_version)
+    filtered_pivot = price_pivot.loc[start_ts:end_ts]
+    
+    # Interval-aggregated price series for the steel commodities, shared by the input and output charts;
+    # cached per interval and date range, so only a new interval or window re-aggregates
+    interval_series = aggregate_prices(steel_slices, selected_interval, start_ts, end_ts, data_version)
+    # Lowest and highest price of each steel commodity in the window, for the chart y-ranges
+    price_extremes = pd.DataFrame(
+        [(rows['Price'].min(), rows['Price'].max()) for rows in steel_slices.values()],
+        index=list(steel_slices), columns=['min', 'max'], dtype='float64'
+    )
+    # Period starts for the performance tables, shared by inputs and outputs; each slice ends on its latest date
+    latest_steel_date = max((rows['Date'].iat[-1] for rows in steel_slices.values()), default=None)
+    period_starts = perf_period_starts(latest_steel_date) if latest_steel_date is not None else {}
+    # Performance of every steel commodity in one pass over the pivot; each section picks its own rows
+    steel_performance = perf_table(filtered_pivot, steel_commodities, period_starts)
 
     # Create price trend charts section
     st.markdown("### 📈 Price Trends")
 
     # Input Materials Section
-    st.markdown("""
-        <div style='background-color: #f0f7f4; padding: 1rem; border-radius: 0.5rem; margin-bottom: 1rem;'>
-            <h4 style='margin:0; color: #00816D;'>Input Materials</h4>
-            <p>Raw materials used in steel production</p>
-        </div>
-    """, unsafe_allow_html=True)
-    
-    selected_inputs = st.multiselect(
-        "Select input materials to display:",
-        options=input_commodities,
-        default=input_commodities,
-        key="input_commodities"
+    selected_inputs = render_price_section(
+        'inputs', input_commodities, steel_performance, interval_series, price_extremes,
+        selected_interval, start_date, end_date, hide_gaps, data_version
     )
 
-    # Display Input Materials Performance Table
-    if selected_inputs:
-        st.markdown("#### Performance Summary")
-        
-        # Create performance table for inputs
-        performance_data = []
-        for commodity in selected_inputs:
-            # Get commodity data and ensure datetime index
-            commodity_data = date_filtered_data[date_filtered_data['Commodities'] == commodity].copy()
-            commodity_data['Date'] = pd.to_datetime(commodity_data['Date'])
-            commodity_data.set_index('Date', inplace=True)
-            commodity_data = commodity_data.sort_index()
-            
-            if not commodity_data.empty:
-                latest_price = commodity_data['Price'].iloc[-1]
-                latest_date = commodity_data.index[-1]
-                
-                # Calculate YTD change
-                start_of_year = pd.Timestamp(latest_date.year, 1, 1)
-                ytd_data = commodity_data[commodity_data.index >= start_of_year]
-                ytd_start_price = ytd_data['Price'].iloc[0] if not ytd_data.empty else latest_price
-                ytd_change = ((latest_price - ytd_start_price) / ytd_start_price) * 100
-                
-                # Calculate MTD change
-                start_of_month = pd.Timestamp(latest_date.year, latest_date.month, 1)
-                mtd_data = commodity_data[commodity_data.index >= start_of_month]
-                mtd_start_price = mtd_data['Price'].iloc[0] if not mtd_data.empty else latest_price
-                mtd_change = ((latest_price - mtd_start_price) / mtd_start_price) * 100
-                
-                # Calculate WTD change
-                week_start = commodity_data.index[-1] - pd.Timedelta(days=commodity_data.index[-1].weekday())
-                wtd_start_price = commodity_data[commodity_data.index >= week_start]['Price'].iloc[0]
-                wtd_change = ((latest_price - wtd_start_price) / wtd_start_price) * 100
-                
-                performance_data.append({
-                    'Commodity': commodity,
-                    'Current Price': f"${latest_price:.2f}",
-                    'WTD': f"{wtd_change:+.1f}%",
-                    'MTD': f"{mtd_change:+.1f}%",
-                    'YTD': f"{ytd_change:+.1f}%"
-                })
-        
-        if performance_data:
-            df_performance = pd.DataFrame(performance_data)
-            
-            # Style the dataframe
-            def color_negative_positive(val):
-                try:
-                    if isinstance(val, str) and '%' in val:
-                        num = float(val.replace('%', '').replace('+', ''))
-                        if num < 0:
-                            color = '#dc2626'  # red for negative
-                        elif num > 0:
-                            color = '#16a34a'  # green for positive
-                        else:
-                            color = '#6b7280'  # gray for zero
-                        return f'color: {color}'
-                except:
-                    return ''
-                return ''
-            
-            styled_df = df_performance.style\
-                .apply(lambda x: ['background-color: #f8f9fa' if i % 2 == 0 else '' 
-                                for i in range(len(x))], axis=0)\
-                .applymap(color_negative_positive)
-            
-            st.dataframe(styled_df, use_container_width=True)
-        
-        # Display Input Materials Charts
-        st.markdown("#### Price Charts")
-        # Calculate number of rows needed for input charts
-        num_rows_inputs = (len(selected_inputs) + 1) // 2
-        
-        fig_inputs = make_subplots(
-            rows=num_rows_inputs,
-            cols=2,
-            subplot_titles=selected_inputs,
-            vertical_spacing=0.2,  # Increased vertical spacing
-            horizontal_spacing=0.15  # Increased horizontal spacing
-        )
-        
-        # Create separate ranges for each input material due to different price scales
-        price_ranges = {}
-        for commodity in selected_inputs:
-            commodity_data = date_filtered_data[date_filtered_data['Commodities'] == commodity].copy()
-            if not commodity_data.empty:
-                prices = commodity_data['Price'].tolist()
-                min_price = min(prices)
-                max_price = max(prices)
-                # Add padding (5% below min, 5% above max)
-                price_ranges[commodity] = {
-                    'min': min_price * 0.95,
-                    'max': max_price * 1.05
-                }
-        
-        # Create individual charts for input materials
-        for i, commodity in enumerate(selected_inputs):
-            row = (i // 2) + 1
-            col = (i % 2) + 1
-            
-            commodity_data = date_filtered_data[date_filtered_data['Commodities'] == commodity].copy()
-            commodity_data = commodity_data.sort_values('Date')
-            
-            if not commodity_data.empty:
-                # Apply interval aggregation
-                if selected_interval == 'Daily':
-                    aggregated_data = commodity_data
-                elif selected_interval == 'Weekly':
-                    commodity_data['Week'] = commodity_data['Date'].dt.to_period('W')
-                    aggregated_data = commodity_data.groupby('Week').last().reset_index()
-                    aggregated_data['Date'] = aggregated_data['Week'].dt.end_time
-                elif selected_interval == 'Monthly':
-                    commodity_data['Month'] = commodity_data['Date'].dt.to_period('M')
-                    aggregated_data = commodity_data.groupby('Month').last().reset_index()
-                    aggregated_data['Date'] = aggregated_data['Month'].dt.end_time
-                elif selected_interval == 'Quarterly':
-                    commodity_data['Quarter'] = commodity_data['Date'].dt.to_period('Q')
-                    aggregated_data = commodity_data.groupby('Quarter').last().reset_index()
-                    aggregated_data['Date'] = aggregated_data['Quarter'].dt.end_time
-                
-                fig_inputs.add_trace(
-                    go.Scatter(
-                        x=aggregated_data['Date'],
-                        y=aggregated_data['Price'],
-                        mode='lines',
-                        name=commodity,
-                        line=dict(color='#4ade80', width=2),
-                        hovertemplate=f'Date: %{{x}}<br>Price: ${{"y:.2f"}}<extra></extra>',
-                        showlegend=False
-                    ),
-                    row=row,
-                    col=col
-                )
-                
-                fig_inputs.update_xaxes(
-                    title_text="Date",
-                    showgrid=True,
-                    gridwidth=1,
-                    gridcolor='rgba(0,0,0,0.1)',
-                    showline=True,
-                    linewidth=1,
-                    linecolor='rgba(0,0,0,0.2)',
-                    row=row,
-                    col=col
-                )
-                # Get the specific range for this commodity
-                y_range = price_ranges.get(commodity, {'min': 0, 'max': 100})
-                
-                fig_inputs.update_yaxes(
-                    title_text="Price ($)",
-                    showgrid=True,
-                    gridwidth=1,
-                    gridcolor='rgba(0,0,0,0.1)',
-                    showline=True,
-                    linewidth=1,
-                    linecolor='rgba(0,0,0,0.2)',
-                    range=[y_range['min'], y_range['max']],
-                    row=row,
-                    col=col
-                )
-        
-        height_per_row = 300
-        total_height = num_rows_inputs * height_per_row
-        
-        fig_inputs.update_layout(
-            template="plotly_white",
-            height=total_height + 100,  # Added more height for spacing
-            margin=dict(l=50, r=50, t=80, b=50),  # Increased top margin further
-            font=dict(family="Manrope, sans-serif", size=12),
-            showlegend=False,
-            hovermode='x unified'
-        )
-        # Shorten date labels and optionally hide weekend gaps
-        fig_inputs.update_xaxes(tickformat='%b %y', tickangle=-30)
-        if hide_gaps:
-            fig_inputs.update_xaxes(rangebreaks=[dict(bounds=["sat", "mon"])])
-        
-        st.plotly_chart(fig_inputs, use_container_width=True, config={"scrollZoom": True})
-
     # Output Products Section
-    st.markdown("""
-        <div style='background-color: #f0f7f4; padding: 1rem; border-radius: 0.5rem; margin-bottom: 1rem;'>
-            <h4 style='margin:0; color: #00816D;'>Output Products</h4>
-            <p>Finished steel products</p>
-        </div>
-    """, unsafe_allow_html=True)
-    
-    selected_outputs = st.multiselect(
-        "Select output products to display:",
-        options=output_commodities,
-        default=output_commodities,
-        key="output_commodities"
+    selected_outputs = render_price_section(
+        'outputs', output_commodities, steel_performance, interval_series, price_extremes,
+        selected_interval, start_date, end_date, hide_gaps, data_version
     )
 
-    # Display Output Products Performance Table
     if selected_outputs:
-        st.markdown("#### Performance Summary")
-        
-        # Create performance table for outputs
-        performance_data = []
-        for commodity in selected_outputs:
-            # Get commodity data and ensure datetime index
-            commodity_data = date_filtered_data[date_filtered_data['Commodities'] == commodity].copy()
-            commodity_data['Date'] = pd.to_datetime(commodity_data['Date'])
-            commodity_data.set_index('Date', inplace=True)
-            commodity_data = commodity_data.sort_index()
-            
-            if not commodity_data.empty:
-                latest_price = commodity_data['Price'].iloc[-1]
-                latest_date = commodity_data.index[-1]
-                
-                # Calculate YTD change
-                start_of_year = pd.Timestamp(latest_date.year, 1, 1)
-                ytd_data = commodity_data[commodity_data.index >= start_of_year]
-                ytd_start_price = ytd_data['Price'].iloc[0] if not ytd_data.empty else latest_price
-                ytd_change = ((latest_price - ytd_start_price) / ytd_start_price) * 100
-                
-                # Calculate MTD change
-                start_of_month = pd.Timestamp(latest_date.year, latest_date.month, 1)
-                mtd_data = commodity_data[commodity_data.index >= start_of_month]
-                mtd_start_price = mtd_data['Price'].iloc[0] if not mtd_data.empty else latest_price
-                mtd_change = ((latest_price - mtd_start_price) / mtd_start_price) * 100
-                
-                # Calculate WTD change
-                week_start = commodity_data.index[-1] - pd.Timedelta(days=commodity_data.index[-1].weekday())
-                wtd_start_price = commodity_data[commodity_data.index >= week_start]['Price'].iloc[0]
-                wtd_change = ((latest_price - wtd_start_price) / wtd_start_price) * 100
-                
-                performance_data.append({
-                    'Commodity': commodity,
-                    'Current Price': f"${latest_price:.2f}",
-                    'WTD': f"{wtd_change:+.1f}%",
-                    'MTD': f"{mtd_change:+.1f}%",
-                    'YTD': f"{ytd_change:+.1f}%"
-                })
-        
-        if performance_data:
-            df_performance = pd.DataFrame(performance_data)
-            
-            # Style the dataframe
-            def color_negative_positive(val):
-                try:
-                    if isinstance(val, str) and '%' in val:
-                        num = float(val.replace('%', '').replace('+', ''))
-                        if num < 0:
-                            color = '#dc2626'  # red for negative
-                        elif num > 0:
-                            color = '#16a34a'  # green for positive
-                        else:
-                            color = '#6b7280'  # gray for zero
-                        return f'color: {color}'
-                except:
-                    return ''
-                return ''
-            
-            styled_df = df_performance.style\
-                .apply(lambda x: ['background-color: #f8f9fa' if i % 2 == 0 else '' 
-                                for i in range(len(x))], axis=0)\
-                .applymap(color_negative_positive)
-            
-            st.dataframe(styled_df, use_container_width=True)
-        
-        # Display Output Products Charts
-        st.markdown("#### Price Charts")
-        # Calculate number of rows needed for output charts
-        num_rows_outputs = (len(selected_outputs) + 1) // 2
-        
-        fig_outputs = make_subplots(
-            rows=num_rows_outputs,
-            cols=2,
-            subplot_titles=selected_outputs,
-            vertical_spacing=0.12,
-            horizontal_spacing=0.1
-        )
-        
-        # Track min and max values for output products
-        output_prices = []
-        for commodity in selected_outputs:
-            commodity_data = date_filtered_data[date_filtered_data['Commodities'] == commodity].copy()
-            if not commodity_data.empty:
-                output_prices.extend(commodity_data['Price'].tolist())
-        
-        y_min_outputs = min(output_prices) * 0.95 if output_prices else 0
-        y_max_outputs = max(output_prices) * 1.05 if output_prices else 100
-        
-        # Create individual charts for output products
-        for i, commodity in enumerate(selected_outputs):
-            row = (i // 2) + 1
-            col = (i % 2) + 1
-            
-            commodity_data = date_filtered_data[date_filtered_data['Commodities'] == commodity].copy()
-            commodity_data = commodity_data.sort_values('Date')
-            
-            if not commodity_data.empty:
-                # Apply interval aggregation
-                if selected_interval == 'Daily':
-                    aggregated_data = commodity_data
-                elif selected_interval == 'Weekly':
-                    commodity_data['Week'] = commodity_data['Date'].dt.to_period('W')
-                    aggregated_data = commodity_data.groupby('Week').last().reset_index()
-                    aggregated_data['Date'] = aggregated_data['Week'].dt.end_time
-                elif selected_interval == 'Monthly':
-                    commodity_data['Month'] = commodity_data['Date'].dt.to_period('M')
-                    aggregated_data = commodity_data.groupby('Month').last().reset_index()
-                    aggregated_data['Date'] = aggregated_data['Month'].dt.end_time
-                elif selected_interval == 'Quarterly':
-                    commodity_data['Quarter'] = commodity_data['Date'].dt.to_period('Q')
-                    aggregated_data = commodity_data.groupby('Quarter').last().reset_index()
-                    aggregated_data['Date'] = aggregated_data['Quarter'].dt.end_time
-                
-                fig_outputs.add_trace(
-                    go.Scatter(
-                        x=aggregated_data['Date'],
-                        y=aggregated_data['Price'],
-                        mode='lines',
-                        name=commodity,
-                        line=dict(color='#f87171', width=2),
-                        hovertemplate=f'Date: %{{x}}<br>Price: ${{"y:.2f"}}<extra></extra>',
-                        showlegend=False
-                    ),
-                    row=row,
-                    col=col
-                )
-                
-                fig_outputs.update_xaxes(
-                    title_text="Date",
-                    showgrid=True,
-                    gridwidth=1,
-                    gridcolor='rgba(0,0,0,0.1)',
-                    showline=True,
-                    linewidth=1,
-                    linecolor='rgba(0,0,0,0.2)',
-                    tickformat='%b %y',
-                    tickangle=-30,
-                    row=row,
-                    col=col
-                )
-                # Optionally hide weekend gaps
-                if hide_gaps:
-                    fig_outputs.update_xaxes(rangebreaks=[dict(bounds=["sat", "mon"])], row=row, col=col)
-                fig_outputs.update_yaxes(
-                    title_text="Price ($)",
-                    showgrid=True,
-                    gridwidth=1,
-                    gridcolor='rgba(0,0,0,0.1)',
-                    showline=True,
-                    linewidth=1,
-                    linecolor='rgba(0,0,0,0.2)',
-                    range=[y_min_outputs, y_max_outputs],
-                    row=row,
-                    col=col
-                )
-        
-        height_per_row = 300
-        total_height = num_rows_outputs * height_per_row
-        
-        fig_outputs.update_layout(
-            template="plotly_white",
-            height=total_height,
-            margin=dict(l=50, r=50, t=40, b=50),
-            font=dict(family="Manrope, sans-serif", size=12),
-            showlegend=False,
-            hovermode='x unified'
-        )
-        
-        st.plotly_chart(fig_outputs, use_container_width=True, config={"scrollZoom": True})
-
         # Add Steel Volumes Analysis right after output prices
         st.markdown("""
             <div style='background-color: #f0f7f4; padding: 1rem; border-radius: 0.5rem; margin-bottom: 1rem;'>
@@ -560,45 +882,8 @@ if df_data is not None and df_list is not None:
         </div>
     """, unsafe_allow_html=True)
 
-    # Calculate production cost and profit
-    if not date_filtered_data.empty:
-        # Update price_pivot with filtered data
-        filtered_price_pivot = price_pivot[
-            (price_pivot.index >= pd.to_datetime(start_date)) & 
-            (price_pivot.index <= pd.to_datetime(end_date))
-        ].copy()
-        
-        # Calculate 30-day moving averages for input materials
-        filtered_price_pivot['Ore_30d_MA'] = filtered_price_pivot['Ore 62'].rolling(window=30, min_periods=1).mean()
-        filtered_price_pivot['Coal_30d_MA'] = filtered_price_pivot['Aus Met Coal'].rolling(window=30, min_periods=1).mean()
-        filtered_price_pivot['Scrap_30d_MA'] = filtered_price_pivot['Scrap'].rolling(window=30, min_periods=1).mean()
-        
-        # Calculate raw material cost using 30-day moving averages for inputs
-        price_pivot['Raw_Material_Cost'] = (
-            price_pivot['Ore_30d_MA'] * 1.6 +  # Iron ore component (30-day MA)
-            price_pivot['Coal_30d_MA'] * 0.6 +  # Met coal component (30-day MA)
-            price_pivot['Scrap_30d_MA'] * 0.1   # Scrap component (30-day MA)
-        )
-        
-        # Add depreciation and SGA costs (converted from VND to USD)
-        price_pivot['Depreciation'] = 35  # 850k VND/ton ≈ 35 USD/ton
-        price_pivot['SGA'] = 19  # 450k VND/ton ≈ 19 USD/ton
-        
-        # Calculate total production cost
-        price_pivot['Production_Cost'] = (
-            price_pivot['Raw_Material_Cost'] +
-            price_pivot['Depreciation'] +
-            price_pivot['SGA']
-        )
-        
-        # Calculate pre-tax profits using spot prices for outputs
-        price_pivot['HRC_Profit_PreTax'] = price_pivot['China HRC'] - price_pivot['Production_Cost']
-        price_pivot['Long_Steel_Profit_PreTax'] = price_pivot['China Long steel'] - price_pivot['Production_Cost']
-        
-        # Calculate after-tax profits (12% corporate tax)
-        price_pivot['HRC_Profit'] = price_pivot['HRC_Profit_PreTax'] * (1 - 0.12)  # After 12% tax
-        price_pivot['Long_Steel_Profit'] = price_pivot['Long_Steel_Profit_PreTax'] * (1 - 0.12)  # After 12% tax
-
+    # Production cost and profit come precomputed on price_pivot
+    if steel_slices:
         # Add Steel Volumes Analysis after profit calculations
         st.markdown("### 📊 Steel Volumes Analysis")
         # Create a copy of price_pivot to avoid modifying the original
@@ -607,37 +892,27 @@ if df_data is not None and df_list is not None:
         render_steel_volumes_section(volumes_data)
         
         # Load volumes data
-        volumes_df = pd.read_csv('data/steel_volumes.csv', parse_dates=['Date'], index_col='Date')
-        
-        # Get HPG volumes for Coil (HRC) and Rebar
-        hpg_rebar = volumes_df['Rebar - HPG']
-        hpg_coil = volumes_df['Coil - HPG']
-        
-        # Align volume data with price_pivot index
-        common_index = price_pivot.index.intersection(volumes_df.index)
-        price_pivot = price_pivot.loc[common_index]
-        hpg_rebar = hpg_rebar.loc[common_index]
-        hpg_coil = hpg_coil.loc[common_index]
+        volumes_df = load_volumes()
         
-        # Calculate total NPAT by product
-        price_pivot['HRC_NPAT'] = price_pivot['HRC_Profit'] * hpg_coil
-        price_pivot['Long_Steel_NPAT'] = price_pivot['Long_Steel_Profit'] * hpg_rebar
-        price_pivot['Total_NPAT'] = price_pivot['HRC_NPAT'] + price_pivot['Long_Steel_NPAT']
+        # HPG NPAT by month and by quarter
+        price_pivot, quarterly_profits = build_profit_frames(price_pivot, volumes_df, data_version)
         
         # Create monthly profit chart
         monthly_profit_fig = go.Figure()
-        monthly_profit_fig.add_trace(go.Bar(
-            name='HRC Profit',
-            x=price_pivot.index,
-            y=price_pivot['HRC_NPAT'],
-            marker_color='rgb(55, 83, 109)'
-        ))
-        monthly_profit_fig.add_trace(go.Bar(
-            name='Long Steel Profit',
-            x=price_pivot.index,
-            y=price_pivot['Long_Steel_NPAT'],
-            marker_color='rgb(26, 118, 255)'
-        ))
+        monthly_profit_fig.add_traces([
+            go.Bar(
+                name='HRC Profit',
+                x=price_pivot.index,
+                y=price_pivot['HRC_NPAT'],
+                marker_color='rgb(55, 83, 109)'
+            ),
+            go.Bar(
+                name='Long Steel Profit',
+                x=price_pivot.index,
+                y=price_pivot['Long_Steel_NPAT'],
+                marker_color='rgb(26, 118, 255)'
+            )
+        ])
         
         monthly_profit_fig.update_layout(
             title='HPG Monthly Profit Breakdown',
@@ -648,165 +923,17 @@ if df_data is not None and df_list is not None:
             template='plotly_white'
         )
         
-        # Calculate quarterly profits
-        price_pivot['Quarter'] = price_pivot.index.quarter
-        quarterly_profits = price_pivot.groupby('Quarter').agg({
-            'HRC_NPAT': 'sum',
-            'Long_Steel_NPAT': 'sum',
-            'Total_NPAT': 'sum'
-        }).reset_index()
+        current_year = price_pivot.index[-1].year
         
-        # Create quarterly profit chart
-        quarterly_profit_fig = go.Figure()
-        quarterly_profit_fig.add_trace(go.Bar(
-            name='HRC Profit',
-            x=quarterly_profits['Quarter'].apply(lambda x: f'Q{x}'),
-            y=quarterly_profits['HRC_NPAT'],
-            marker_color='rgb(55, 83, 109)'
-        ))
-        quarterly_profit_fig.add_trace(go.Bar(
-            name='Long Steel Profit',
-            x=quarterly_profits['Quarter'].apply(lambda x: f'Q{x}'),
-            y=quarterly_profits['Long_Steel_NPAT'],
-            marker_color='rgb(26, 118, 255)'
-        ))
-        
-        quarterly_profit_fig.update_layout(
-            title='HPG Quarterly Profit Breakdown',
-            xaxis_title='Quarter',
-            yaxis_title='Profit (USD)',
-            barmode='stack',
-            showlegend=True,
-            template='plotly_white'
+        # Display FX Rate Information, listed from the same table the profits are converted with
+        fx_rate_lines = "\n".join(f"- {year}: {rate:,}" for year, rate in FX_RATES.items())
+        st.sidebar.subheader("Exchange Rate Information")
+        st.sidebar.markdown(
+            f"**Current FX Rates (VND/USD):**\n{fx_rate_lines}\n\n**Active Rate:** {fx_rates_for(current_year):,} VND/USD"
         )
         
-        # Add currency selection
         st.subheader("HPG's Profit Analysis")
-        currency = st.selectbox(
-            "Select Currency",
-            ["USD", "VND (billion)"],
-            key="profit_currency"
-        )
-        
-        # Define FX rates by year
-        fx_rates = {
-            2023: 23500,
-            2024: 24000,
-            2025: 25300
-        }
-        
-        # Create FX rate series based on date index
-        price_pivot['fx_rate'] = price_pivot.index.year.map(fx_rates)
-        
-        # Convert to VND billion if selected
-        if currency == "VND (billion)":
-            price_pivot['HRC_NPAT_display'] = price_pivot['HRC_NPAT'] * price_pivot['fx_rate'] / 1e9
-            price_pivot['Long_Steel_NPAT_display'] = price_pivot['Long_Steel_NPAT'] * price_pivot['fx_rate'] / 1e9
-            
-            # For quarterly data, calculate weighted average FX rate per quarter
-            quarterly_fx = price_pivot.groupby('Quarter').agg({
-                'fx_rate': 'mean',
-                'HRC_NPAT': 'sum',
-                'Long_Steel_NPAT': 'sum'
-            }).reset_index()
-            
-            quarterly_profits['HRC_NPAT_display'] = quarterly_fx['HRC_NPAT'] * quarterly_fx['fx_rate'] / 1e9
-            quarterly_profits['Long_Steel_NPAT_display'] = quarterly_fx['Long_Steel_NPAT'] * quarterly_fx['fx_rate'] / 1e9
-            currency_label = "Profit (VND billion)"
-        else:
-            price_pivot['HRC_NPAT_display'] = price_pivot['HRC_NPAT']
-            price_pivot['Long_Steel_NPAT_display'] = price_pivot['Long_Steel_NPAT']
-            quarterly_profits['HRC_NPAT_display'] = quarterly_profits['HRC_NPAT']
-            quarterly_profits['Long_Steel_NPAT_display'] = quarterly_profits['Long_Steel_NPAT']
-            currency_label = "Profit (USD)"
-
-
-        
-        # Create quarterly profit chart
-        quarterly_profit_fig = go.Figure()
-        quarterly_profit_fig.add_trace(go.Bar(
-            name='HRC Profit',
-            x=quarterly_profits['Quarter'].apply(lambda x: f'Q{x}'),
-            y=quarterly_profits['HRC_NPAT_display'],
-            marker_color='rgb(55, 83, 109)'
-        ))
-        quarterly_profit_fig.add_trace(go.Bar(
-            name='Long Steel Profit',
-            x=quarterly_profits['Quarter'].apply(lambda x: f'Q{x}'),
-            y=quarterly_profits['Long_Steel_NPAT_display'],
-            marker_color='rgb(26, 118, 255)'
-        ))
-        
-        quarterly_profit_fig.update_layout(
-            title='HPG Quarterly Profit Breakdown',
-            xaxis_title='Quarter',
-            yaxis_title=currency_label,
-            barmode='stack',
-            showlegend=True,
-            template='plotly_white'
-        )
-
-        # Display total profit for the current period
-        current_month = price_pivot.index[-1]
-        current_quarter = current_month.quarter
-        current_year = current_month.year
-        
-        # Display FX Rate Information
-        st.sidebar.subheader("Exchange Rate Information")
-        st.sidebar.markdown(f"""
-        **Current FX Rates (VND/USD):**
-        - 2023: 23,500
-        - 2024: 24,000
-        - 2025: 25,300
-        
-        **Active Rate:** {fx_rates[current_year]:,} VND/USD
-        """)
-        
-        # Create three columns for metrics
-        col1, col2, col3 = st.columns(3)
-        
-        # Get current rates and profits
-        current_fx_rate = price_pivot['fx_rate'].iloc[-1]
-        quarter_fx_rate = price_pivot[price_pivot.index.quarter == current_quarter]['fx_rate'].mean()
-        
-        with col1:
-            st.markdown("### Current Month")
-            if currency == "VND (billion)":
-                current_month_profit = price_pivot['Total_NPAT'].iloc[-1] * current_fx_rate / 1e9
-                st.metric("Profit", f"{current_month_profit:,.1f} VND bn")
-                # Also show USD value for reference
-                st.metric("USD Equivalent", f"${price_pivot['Total_NPAT'].iloc[-1]:,.0f}")
-            else:
-                current_month_profit = price_pivot['Total_NPAT'].iloc[-1]
-                st.metric("Profit", f"${current_month_profit:,.0f}")
-                # Show VND value for reference
-                st.metric("VND Equivalent", f"{current_month_profit * current_fx_rate / 1e9:,.1f} bn")
-        
-        with col2:
-            st.markdown(f"### Q{current_quarter}")
-            quarter_total = quarterly_profits[quarterly_profits['Quarter'] == current_quarter]['Total_NPAT'].values[0]
-            if currency == "VND (billion)":
-                current_quarter_profit = quarter_total * quarter_fx_rate / 1e9
-                st.metric("Profit", f"{current_quarter_profit:,.1f} VND bn")
-                st.metric("USD Equivalent", f"${quarter_total:,.0f}")
-            else:
-                st.metric("Profit", f"${quarter_total:,.0f}")
-                st.metric("VND Equivalent", f"{quarter_total * quarter_fx_rate / 1e9:,.1f} bn")
-        
-        with col3:
-            st.markdown("### Year to Date")
-            ytd_total_usd = price_pivot[price_pivot.index.year == current_year]['Total_NPAT'].sum()
-            ytd_avg_fx = price_pivot[price_pivot.index.year == current_year]['fx_rate'].mean()
-            if currency == "VND (billion)":
-                ytd_total_vnd = ytd_total_usd * ytd_avg_fx / 1e9
-                st.metric("Profit", f"{ytd_total_vnd:,.1f} VND bn")
-                st.metric("USD Equivalent", f"${ytd_total_usd:,.0f}")
-            else:
-                st.metric("Profit", f"${ytd_total_usd:,.0f}")
-                st.metric("VND Equivalent", f"{ytd_total_usd * ytd_avg_fx / 1e9:,.1f} bn")
-        
-        # Display the quarterly profit chart
-        st.plotly_chart(quarterly_profit_fig, use_container_width=True)
+        render_profit_summary(price_pivot, quarterly_profits)
 
         # Reset index to make Date a column
         price_pivot = price_pivot.reset_index()
@@ -815,36 +942,40 @@ if df_data is not None and df_list is not None:
         st.markdown("### 📈 Profit Analysis")
         
         # Ensure we have all required columns
-        required_columns = ['China HRC', 'China Long steel', 'Production_Cost']
+        required_columns = ['China HRC', 'China Long steel', 'HRC_Profit_PreTax', 'Long_Steel_Profit_PreTax']
         missing_cols = [col for col in required_columns if col not in price_pivot.columns]
         
         if missing_cols:
             st.error(f"Missing required columns: {', '.join(missing_cols)}")
         else:
-            # Calculate profit per ton
-            price_pivot['HRC_Profit_per_Ton'] = (
-                price_pivot['China HRC'] - price_pivot['Production_Cost']
-            ).fillna(0)
-            
-            price_pivot['Rebar_Profit_per_Ton'] = (
-                price_pivot['China Long steel'] - price_pivot['Production_Cost']
-            ).fillna(0)
-            
-            # Calculate profit margins (as percentages)
-            price_pivot['HRC_Margin'] = np.where(
-                price_pivot['China HRC'] > 0,
-                (price_pivot['HRC_Profit_per_Ton'] / price_pivot['China HRC']) * 100,
-                0
-            )
+            # Profit per ton is the pre-tax profit steel_costs_profits already computed; copied, since NaNs are filled below
+            hrc_prices = price_pivot['China HRC'].to_numpy(dtype=np.float64)
+            rebar_prices = price_pivot['China Long steel'].to_numpy(dtype=np.float64)
+            hrc_profit_per_ton = price_pivot['HRC_Profit_PreTax'].to_numpy(dtype=np.float64, copy=True)
+            rebar_profit_per_ton = price_pivot['Long_Steel_Profit_PreTax'].to_numpy(dtype=np.float64, copy=True)
+            # Days with a missing price or cost count as zero profit
+            hrc_profit_per_ton[np.isnan(hrc_profit_per_ton)] = 0
+            rebar_profit_per_ton[np.isnan(rebar_profit_per_ton)] = 0
             
-            price_pivot['Rebar_Margin'] = np.where(
-                price_pivot['China Long steel'] > 0,
-                (price_pivot['Rebar_Profit_per_Ton'] / price_pivot['China Long steel']) * 100,
-                0
-            )
-            
-            # Replace any remaining infinities with 0
-            price_pivot = price_pivot.replace([np.inf, -np.inf], 0)
+            # Calculate profit margins (as percentages), and add all four columns in a single assignment
+            with np.errstate(invalid='ignore', divide='ignore'):
+                price_pivot = price_pivot.assign(
+                    HRC_Profit_per_Ton=hrc_profit_per_ton,
+                    Rebar_Profit_per_Ton=rebar_profit_per_ton,
+                    HRC_Margin=np.where(hrc_prices > 0, hrc_profit_per_ton / hrc_prices * 100, 0),
+                    Rebar_Margin=np.where(rebar_prices > 0, rebar_profit_per_ton / rebar_prices * 100, 0)
+                )
+        
+        # Plot against the Date column, which is already in order unless the data says otherwise
+        plot_data = price_pivot if price_pivot['Date'].is_monotonic_increasing else price_pivot.sort_values('Date')
+        plot_dates = plot_data['Date'].to_numpy()
+        # Long histories are thinned with LTTB so the browser draws at most ~1500 points per line,
+        # and sent as float32 since the charts need no more precision
+        profit_lines = {
+            col: downsample_series(plot_dates, plot_data[col].to_numpy(dtype=np.float32))
+            for col in ('HRC_Profit_per_Ton', 'Rebar_Profit_per_Ton', 'HRC_Margin', 'Rebar_Margin')
+        }
+        profit_trace = line_trace_type(len(profit_lines['HRC_Profit_per_Ton'][0]))
         
         # Create two columns for the charts
         col1, col2 = st.columns(2)
@@ -853,118 +984,69 @@ if df_data is not None and df_list is not None:
             st.markdown("#### Profit per Ton")
             fig_profit_abs = go.Figure()
             
-            # Sort data by date for proper line display
-            plot_data = price_pivot.sort_index()
-            
             # Add profit per ton lines
-            fig_profit_abs.add_trace(
-                go.Scatter(
-                    x=plot_data.index,
-                    y=plot_data['HRC_Profit_per_Ton'],
+            fig_profit_abs.add_traces([
+                profit_trace(
+                    x=profit_lines['HRC_Profit_per_Ton'][0],
+                    y=profit_lines['HRC_Profit_per_Ton'][1],
                     name='HRC Profit/ton',
                     line=dict(color='#f87171', width=2),
-                    customdata=plot_data['HRC_Profit_per_Ton'],
                     hovertemplate="<b>%{x}</b><br>" +
-                                "Profit/ton: $%{customdata:.2f}<extra></extra>"
-                )
-            )
-            
-            fig_profit_abs.add_trace(
-                go.Scatter(
-                    x=plot_data.index,
-                    y=plot_data['Rebar_Profit_per_Ton'],
+                                "Profit/ton: $%{y:.2f}<extra></extra>"
+                ),
+                profit_trace(
+                    x=profit_lines['Rebar_Profit_per_Ton'][0],
+                    y=profit_lines['Rebar_Profit_per_Ton'][1],
                     name='Rebar Profit/ton',
                     line=dict(color='#fb923c', width=2),
-                    customdata=plot_data['Rebar_Profit_per_Ton'],
                     hovertemplate="<b>%{x}</b><br>" +
-                                "Profit/ton: $%{customdata:.2f}<extra></extra>"
+                                "Profit/ton: $%{y:.2f}<extra></extra>"
                 )
-            )
+            ])
             
             # Update profit per ton layout
-            fig_profit_abs.update_layout(
-                height=400,
-                template='plotly_white',
-                margin=dict(l=50, r=50, t=20, b=50),
-                font=dict(family="Manrope, sans-serif", size=12),
-                showlegend=True,
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="right",
-                    x=1
-                ),
-                hovermode='x unified',
-                xaxis_title="Date",
-                yaxis_title="Profit per Ton (USD)"
-            )
+            fig_profit_abs.update_layout(**PROFIT_LAYOUT, yaxis_title="Profit per Ton (USD)")
             # Add zero line for reference
             fig_profit_abs.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.5)
-            # Shorten date labels and optionally hide weekend gaps
+            # Shorten date labels; the points are monthly, so there are no weekend gaps to hide
             fig_profit_abs.update_xaxes(tickformat='%b %y', tickangle=-30)
-            if hide_gaps:
-                fig_profit_abs.update_xaxes(rangebreaks=[dict(bounds=["sat", "mon"])])
             
-            st.plotly_chart(fig_profit_abs, use_container_width=True, config={"scrollZoom": True})
+            st.plotly_chart(fig_profit_abs, use_container_width=True, config={"scrollZoom": True}, key="profit_abs_chart")
             
         with col2:
             st.markdown("#### Profit Margin (%)")
             fig_profit_margin = go.Figure()
             
             # Add margin lines using sorted data
-            fig_profit_margin.add_trace(
-                go.Scatter(
-                    x=plot_data.index,
-                    y=plot_data['HRC_Margin'],
+            fig_profit_margin.add_traces([
+                profit_trace(
+                    x=profit_lines['HRC_Margin'][0],
+                    y=profit_lines['HRC_Margin'][1],
                     name='HRC Margin',
                     line=dict(color='#f87171', width=2),
-                    customdata=plot_data['HRC_Margin'],
                     hovertemplate="<b>%{x}</b><br>" +
-                                "Margin: %{customdata:.1f}%<extra></extra>"
-                )
-            )
-            
-            fig_profit_margin.add_trace(
-                go.Scatter(
-                    x=plot_data.index,
-                    y=plot_data['Rebar_Margin'],
+                                "Margin: %{y:.1f}%<extra></extra>"
+                ),
+                profit_trace(
+                    x=profit_lines['Rebar_Margin'][0],
+                    y=profit_lines['Rebar_Margin'][1],
                     name='Rebar Margin',
                     line=dict(color='#fb923c', width=2),
-                    customdata=plot_data['Rebar_Margin'],
                     hovertemplate="<b>%{x}</b><br>" +
-                                "Margin: %{customdata:.1f}%<extra></extra>"
+                                "Margin: %{y:.1f}%<extra></extra>"
                 )
-            )
+            ])
             
             # Update margin layout
-            fig_profit_margin.update_layout(
-                height=400,
-                template='plotly_white',
-                margin=dict(l=50, r=50, t=20, b=50),
-                font=dict(family="Manrope, sans-serif", size=12),
-                showlegend=True,
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="right",
-                    x=1
-                ),
-                hovermode='x unified',
-                xaxis_title="Date",
-                yaxis_title="Profit Margin (%)"
-            )
+            fig_profit_margin.update_layout(**PROFIT_LAYOUT, yaxis_title="Profit Margin (%)")
             # Add zero line for reference
             fig_profit_margin.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.5)
-            # Shorten date labels and optionally hide weekend gaps
+            # Shorten date labels; the points are monthly, so there are no weekend gaps to hide
             fig_profit_margin.update_xaxes(tickformat='%b %y', tickangle=-30)
-            if hide_gaps:
-                fig_profit_margin.update_xaxes(rangebreaks=[dict(bounds=["sat", "mon"])])
             # Set y-axis range to show margins clearly
             fig_profit_margin.update_yaxes(range=[-20, 40])
             
-            st.plotly_chart(fig_profit_margin, use_container_width=True, config={"scrollZoom": True})
+            st.plotly_chart(fig_profit_margin, use_container_width=True, config={"scrollZoom": True}, key="profit_margin_chart")
 
         # Add profit metrics
         col1, col2, col3 = st.columns(3)
@@ -996,22 +1078,20 @@ if df_data is not None and df_list is not None:
         
         # Add price changes table
         st.markdown("### 📊 Price Changes")
-        latest_date = df_data['Date'].max()
-        analysis_df = calculate_price_changes(df_data, df_list, latest_date)
+        latest_date = max_date
+        # Looked up by the data version, so reruns don't hash both frames to find the cached result
+        analysis_df = steel_price_changes(df_data, df_list, latest_date, data_version)
     steel_analysis = analysis_df[analysis_df['Commodities'].isin(selected_commodities)].copy()
     
     if not steel_analysis.empty:
         # Create a clean table with specific columns
-        display_df = steel_analysis[['Commodities', '%Day', '%Week', '%Month', '%Quarter', '%YTD']].copy()
+        change_columns = ['%Day', '%Week', '%Month', '%Quarter', '%YTD']
+        display_df = steel_analysis[['Commodities'] + change_columns]
         
-        # Format percentage columns
-        for col in ['%Day', '%Week', '%Month', '%Quarter', '%YTD']:
-            display_df[col] = display_df[col].apply(lambda x: f"{x:.2%}" if pd.notnull(x) else "N/A")
-        
-        # Display the table
-        st.dataframe(
-            display_df.style.apply(lambda x: ['background-color: #f8f9fa' if i % 2 == 0 else '' for i in range(len(x))], axis=0),
-            use_container_width=True
+        # Display the table as prebuilt HTML; it is a short read-only summary, so it skips the interactive grid
+        st.markdown(
+            price_changes_html(display_df, tuple(selected_commodities), data_version),
+            unsafe_allow_html=True
         )
         
         # Add impact analysis
@@ -1020,16 +1100,15 @@ if df_data is not None and df_list is not None:
         impact_df = impact_df[impact_df['Impact'].notna()]
         
         if not impact_df.empty:
-            st.markdown("""
+            # The card and its list go out as one element, so the list renders inside the card
+            items = "<li><b>" + impact_df['Commodities'].astype(str) + "</b>: " + impact_df['Impact'].astype(str) + "</li>"
+            st.markdown(f"""
                 <div style='background-color: #f8f9fa; padding: 1rem; border-radius: 0.5rem;'>
                     <h4 style='margin-top:0;'>Market Impact</h4>
                     <p>The following stocks are impacted by these commodities:</p>
+                    <ul>{items.str.cat()}</ul>
+                </div>
             """, unsafe_allow_html=True)
-            
-            for _, row in impact_df.iterrows():
-                st.markdown(f"- **{row['Commodities']}**: {row['Impact']}")
-            
-            st.markdown("</div>", unsafe_allow_html=True)
     else:
         st.info("No price change data available for the selected commodities.")
 
@@ -1044,161 +1123,17 @@ if df_data is not None and df_list is not None:
     # Fetch stock data for steel companies
     steel_companies = ['HPG', 'HSG', 'NKG']
     
-    # Technical overlay and indicator controls
-    st.markdown("#### Stock Chart Tools")
-    col_ma, col_ind = st.columns(2)
-    with col_ma:
-        ma_options = ["MA9", "MA50", "MA200"]
-        selected_ma = st.multiselect("Moving Averages", options=ma_options, default=["MA50"])
-    with col_ind:
-        ind_options = ["MACD", "RSI"]
-        selected_ind = st.multiselect("Indicators", options=ind_options, default=[])
-
     stock_data = fetch_multiple_stocks(steel_companies)
     
     if stock_data:
-        # Render candlestick + volume charts per company in tabs
-        tabs = st.tabs(steel_companies)
-        for idx, ticker in enumerate(steel_companies):
-            data = stock_data.get(ticker)
-            if data is None or data.empty:
-                continue
-
-            with tabs[idx]:
-                # Determine subplot structure based on selected indicators
-                rows = 2 + (1 if "MACD" in selected_ind else 0) + (1 if "RSI" in selected_ind else 0)
-                row_heights = [0.6, 0.25]
-                if "MACD" in selected_ind:
-                    row_heights.append(0.15)
-                if "RSI" in selected_ind:
-                    row_heights.append(0.15)
-
-                fig_candle = make_subplots(
-                    rows=rows,
-                    cols=1,
-                    shared_xaxes=True,
-                    vertical_spacing=0.03,
-                    row_heights=row_heights
-                )
-
-                # Candlestick
-                fig_candle.add_trace(
-                    go.Candlestick(
-                        x=data['tradingDate'],
-                        open=data['open'],
-                        high=data['high'],
-                        low=data['low'],
-                        close=data['close'],
-                        name=ticker,
-                        increasing_line_color="#16a34a",
-                        decreasing_line_color="#dc2626"
-                    ),
-                    row=1,
-                    col=1
-                )
-
-                # Volume bars (colored by up/down day)
-                if 'volume' in data.columns:
-                    vol_colors = [
-                        'rgba(22, 163, 74, 0.6)' if c >= o else 'rgba(220, 38, 38, 0.6)'
-                        for o, c in zip(data['open'], data['close'])
-                    ]
-                    fig_candle.add_trace(
-                        go.Bar(
-                            x=data['tradingDate'],
-                            y=data['volume'],
-                            name='Volume',
-                            marker_color=vol_colors
-                        ),
-                        row=2,
-                        col=1
-                    )
-
-                # Moving Averages on price panel
-                close = data['close']
-                if "MA9" in selected_ma:
-                    ma9 = close.rolling(window=9, min_periods=1).mean()
-                    fig_candle.add_trace(
-                        go.Scatter(x=data['tradingDate'], y=ma9, name='MA9', line=dict(color='#22c55e', width=1.5)),
-                        row=1, col=1
-                    )
-                if "MA50" in selected_ma:
-                    ma50 = close.rolling(window=50, min_periods=1).mean()
-                    fig_candle.add_trace(
-                        go.Scatter(x=data['tradingDate'], y=ma50, name='MA50', line=dict(color='#3b82f6', width=1.5)),
-                        row=1, col=1
-                    )
-                if "MA200" in selected_ma:
-                    ma200 = close.rolling(window=200, min_periods=1).mean()
-                    fig_candle.add_trace(
-                        go.Scatter(x=data['tradingDate'], y=ma200, name='MA200', line=dict(color='#f59e0b', width=1.5)),
-                        row=1, col=1
-                    )
-
-                # Indicators panels
-                current_row = 3
-                if "MACD" in selected_ind:
-                    ema12 = close.ewm(span=12, adjust=False).mean()
-                    ema26 = close.ewm(span=26, adjust=False).mean()
-                    macd = ema12 - ema26
-                    signal = macd.ewm(span=9, adjust=False).mean()
-                    hist = macd - signal
-                    hist_colors = ['rgba(34,197,94,0.6)' if h >= 0 else 'rgba(239,68,68,0.6)' for h in hist]
-                    fig_candle.add_trace(go.Bar(x=data['tradingDate'], y=hist, marker_color=hist_colors, name='MACD Hist'), row=current_row, col=1)
-                    fig_candle.add_trace(go.Scatter(x=data['tradingDate'], y=macd, name='MACD', line=dict(color='#111827', width=1.5)), row=current_row, col=1)
-                    fig_candle.add_trace(go.Scatter(x=data['tradingDate'], y=signal, name='Signal', line=dict(color='#f43f5e', width=1.2, dash='dot')), row=current_row, col=1)
-                    fig_candle.update_yaxes(title_text="MACD", row=current_row, col=1)
-                    current_row += 1
-                if "RSI" in selected_ind:
-                    delta = close.diff()
-                    gain = delta.where(delta > 0, 0.0)
-                    loss = -delta.where(delta < 0, 0.0)
-                    avg_gain = gain.ewm(alpha=1/14, min_periods=14, adjust=False).mean()
-                    avg_loss = loss.ewm(alpha=1/14, min_periods=14, adjust=False).mean()
-                    rs = avg_gain / avg_loss
-                    rsi = 100 - (100 / (1 + rs))
-                    fig_candle.add_trace(go.Scatter(x=data['tradingDate'], y=rsi, name='RSI(14)', line=dict(color='#06b6d4', width=1.5)), row=current_row, col=1)
-                    # Overbought/oversold reference lines
-                    fig_candle.add_trace(go.Scatter(x=data['tradingDate'], y=[70]*len(rsi), name='70', line=dict(color='rgba(156,163,175,0.7)', width=1, dash='dash')), row=current_row, col=1)
-                    fig_candle.add_trace(go.Scatter(x=data['tradingDate'], y=[30]*len(rsi), name='30', line=dict(color='rgba(156,163,175,0.7)', width=1, dash='dash')), row=current_row, col=1)
-                    fig_candle.update_yaxes(title_text="RSI", range=[0, 100], row=current_row, col=1)
-
-                fig_candle.update_layout(
-                    height=520,
-                    template='plotly_white',
-                    margin=dict(l=50, r=50, t=20, b=40),
-                    font=dict(family="Manrope, sans-serif", size=12),
-                    showlegend=False,
-                    hovermode='x unified',
-                    dragmode='pan',
-                    uirevision='candlestick',
-                    xaxis_rangeslider_visible=False,
-                    xaxis2_rangeslider_visible=False
-                )
-
-                # Axis titles and short date ticks
-                fig_candle.update_yaxes(title_text="Price (VND)", row=1, col=1)
-                fig_candle.update_yaxes(title_text="Volume", row=2, col=1)
-                # Label bottom-most x-axis only
-                fig_candle.update_xaxes(title_text="Date", tickformat='%b %y', tickangle=-30, row=rows, col=1)
-
-                # Optionally hide weekends and ensure no range slider appears
-                if hide_gaps:
-                    for r in range(1, rows+1):
-                        fig_candle.update_xaxes(rangebreaks=[dict(bounds=["sat", "mon"])], row=r, col=1)
-                # Explicitly disable range slider on all subplots
-                for r in range(1, rows+1):
-                    fig_candle.update_xaxes(rangeslider_visible=False, row=r, col=1)
-
-                st.plotly_chart(fig_candle, use_container_width=True, config={"scrollZoom": True})
+        render_stock_charts(stock_data, steel_companies, hide_gaps)
         
         # Add current stock prices and changes
         stock_cols = st.columns(3)
         
         for i, (ticker, data) in enumerate(stock_data.items()):
             if data is not None and not data.empty:
-                current_price = data['close'].iloc[-1]
-                prev_price = data['close'].iloc[-2]
+                current_price, prev_price = data['close'].to_numpy()[[-1, -2]]
                 price_change = ((current_price - prev_price) / prev_price) * 100
                 
                 with stock_cols[i]: